@@ -1,4 +1,8 @@
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import before_task_publish, task_prerun, task_postrun
+
+from app.core.tracing import tracer, current_span, current_trace_id
 
 
 celery_app = Celery(
@@ -14,6 +18,39 @@ celery_app.conf.update(
     accept_content=['json'], 
     result_serializer='json', 
     timezone='Europe/Moscow', 
-    enable_utc=True
+    enable_utc=True,
+    beat_schedule={
+        'reconcile-balances': {'task': 'app.core.tasks.reconcile_balances', 'schedule': crontab(hour=3, minute=0)},
+        'maintain-transaction-partitions': {
+            'task': 'app.core.tasks.maintain_transaction_partitions', 
+            'schedule': crontab(hour=2, minute=30),
+            },
+        },
     )
 
+
+@before_task_publish.connect
+def add_trace_headers(headers=None, **kwargs):
+    trace_id = current_trace_id()
+    if trace_id is not None and headers is not None:
+        headers['trace_id'] = trace_id
+        headers['parent_span_id'] = current_span.get().span_id
+
+
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    trace_id = task.request.get('trace_id')
+    if trace_id:
+        task_span = tracer.start(f'celery task {task.name}', trace_id, **{'celery.task_id': task_id})
+        task_span.parent_id = task.request.get('parent_span_id')
+        task.request.trace_token = current_span.set(task_span)
+
+
+@task_postrun.connect
+def finish_task_span(task=None, state=None, **kwargs):
+    token = task.request.get('trace_token')
+    if token is not None:
+        task_span = current_span.get()
+        current_span.reset(token)
+        task_span.attributes['celery.state'] = state
+        tracer.finish(task_span)
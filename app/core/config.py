@@ -1,10 +1,16 @@
 import os
+import atexit
+import json
+import queue
+from datetime import datetime, timezone
 
-from pydantic import BaseModel
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from pathlib import Path
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -24,22 +30,161 @@ DB_PASSWORD = os.environ.get('DB_PASSWORD')
 SECRET_KEY_JWT = os.environ.get('SECRET_KEY_JWT')
 
 
+class DatabaseSettings(BaseModel):
+    # Size pools so that workers * (pool_size + max_overflow) stays below Postgres max_connections.
+    pool_size: int = int(os.environ.get('DB_POOL_SIZE', 10))
+    max_overflow: int = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    pool_timeout: float = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    pool_recycle: int = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    pool_pre_ping: bool = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    statement_cache_size: int = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 100))
+    statement_timeout_ms: int = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    replica_url: Optional[str] = os.environ.get('DB_REPLICA_URL')
+    replica_retry_interval: float = float(os.environ.get('DB_REPLICA_RETRY_INTERVAL', 30))
+    read_your_writes: int = int(os.environ.get('DB_READ_YOUR_WRITES', 5))
+
+
+db_settings = DatabaseSettings()
+
+
+class PartitionSettings(BaseModel):
+    # Detached months stay as standalone tables; their rollups are archived first and carried forward by
+    # reconcile_balances and rebuild_rollups. 0 keeps all.
+    months_ahead: int = int(os.environ.get('TRANSACTIONS_PARTITIONS_AHEAD', 3))
+    retention_months: int = int(os.environ.get('TRANSACTIONS_RETENTION_MONTHS', 0))
+
+
+partition_settings = PartitionSettings()
+
+
 class AuthJWT(BaseModel):
+    key_backend: Literal['pem', 'secret', 'jwks'] = os.environ.get('JWT_KEY_BACKEND', 'pem')
     private_key_path: Path = BASE_DIR / ".secret_key" / "private_key.pem"
     public_key_path: Path = BASE_DIR / ".secret_key" / "public_key.pem"
-    algorithm: str = "RS256"
+    jwks_path: Path = Path(os.environ.get('JWT_JWKS_PATH', BASE_DIR / ".secret_key" / "jwks.json"))
+    secret_key: Optional[str] = SECRET_KEY_JWT
+    algorithm: Literal['RS256', 'ES256', 'EdDSA', 'HS256'] = os.environ.get('JWT_ALGORITHM', 'RS256')
+    key_id: Optional[str] = os.environ.get('JWT_KEY_ID')
     expiration: int = 60
     refresh_exp : int = 1
+    key_check_interval: float = 5
+    token_cache_size: int = 4096
 
 
 auth = AuthJWT()
 
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(module)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(), RotatingFileHandler('logs/app_log', maxBytes=5*1024, backupCount=2)] 
-    )
+def optional_env(name: str, cast: type):
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+
+class PasswordHashing(BaseModel):
+    workers: int = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    max_queue: int = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 16))
+    rounds: Optional[int] = Field(default_factory=lambda: optional_env('PASSWORD_HASH_ROUNDS', int))
+    target_ms: Optional[float] = Field(default_factory=lambda: optional_env('PASSWORD_HASH_TARGET_MS', float))
+
+
+password_hashing = PasswordHashing()
+
+
+class RateLimits(BaseModel):
+    window: int = int(os.environ.get('RATE_LIMIT_WINDOW', 60))
+    login_per_ip: int = int(os.environ.get('RATE_LIMIT_LOGIN_PER_IP', 30))
+    login_per_email: int = int(os.environ.get('RATE_LIMIT_LOGIN_PER_EMAIL', 5))
+    registration_per_ip: int = int(os.environ.get('RATE_LIMIT_REGISTRATION_PER_IP', 5))
+    registration_per_email: int = int(os.environ.get('RATE_LIMIT_REGISTRATION_PER_EMAIL', 3))
+
+
+rate_limits = RateLimits()
+
+
+class TracingSettings(BaseModel):
+    exporter: Literal['none', 'jsonl', 'otlp'] = os.environ.get('TRACING_EXPORTER', 'none')
+    sample_rate: float = float(os.environ.get('TRACING_SAMPLE_RATE', 1.0))
+    jsonl_path: Path = Path(os.environ.get('TRACING_JSONL_PATH', 'logs/spans.jsonl'))
+    otlp_endpoint: str = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318')
+    service_name: str = os.environ.get('TRACING_SERVICE_NAME', 'financial-management')
+
+
+tracing_settings = TracingSettings()
+
+
+class QueryStatsSettings(BaseModel):
+    slow_query_ms: float = float(os.environ.get('SLOW_QUERY_MS', 200))
+    slow_query_buffer: int = int(os.environ.get('SLOW_QUERY_BUFFER', 100))
+    # Sent as X-Debug-Token to read /debug/slow-queries; the endpoint answers 404 while it is unset.
+    debug_token: Optional[str] = os.environ.get('DEBUG_TOKEN') or None
+
+
+query_stats_settings = QueryStatsSettings()
+
+
+class LogSettings(BaseModel):
+    level: str = os.environ.get('LOG_LEVEL', 'INFO')
+    file: Path = Path(os.environ.get('LOG_FILE', 'logs/app_log'))
+    max_bytes: int = int(os.environ.get('LOG_MAX_BYTES', 20 * 1024 * 1024))
+    backup_count: int = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+    success_get_sample_rate: float = float(os.environ.get('LOG_SUCCESS_GET_SAMPLE_RATE', 1.0))
+
+
+log_settings = LogSettings()
+
+
+class BodyLogSettings(BaseModel):
+    max_bytes: int = int(os.environ.get('LOG_BODY_MAX_BYTES', 1024))
+    # Per-path overrides of max_bytes; 0 switches body capture off for that path.
+    routes: dict[str, int] = json.loads(os.environ.get('LOG_BODY_ROUTES', '{}'))
+    sensitive_fields: list[str] = [
+        'password', 
+        'hashed_password', 
+        'refresh_token', 
+        'access_token', 
+        'eccess_token', 
+        'token',
+        ]
+
+
+body_log_settings = BodyLogSettings()
+
+
+class JsonFormatter(logging.Formatter):
+    reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'module': record.module,
+            'message': record.getMessage(),
+            }
+        data.update({key: value for key, value in vars(record).items() if key not in self.reserved})
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+# Handlers run in the listener thread; request code only puts records on the queue.
+log_queue = queue.SimpleQueue()
+
+log_formatter = JsonFormatter()
+
+log_handlers = [
+    logging.StreamHandler(), 
+    RotatingFileHandler(log_settings.file, maxBytes=log_settings.max_bytes, backupCount=log_settings.backup_count),
+    ]
+
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+
+logging.basicConfig(level=log_settings.level, handlers=[QueueHandler(log_queue)])
+
+log_listener.start()
+
+atexit.register(log_listener.stop)
 
 logger = logging.getLogger()
 
@@ -50,4 +195,10 @@ class BaseAppException(Exception):
         self.status_code = status_code
 
 
-redis_expire = 86400
\ No newline at end of file
+redis_expire = 86400
+
+user_cache_expire = int(os.environ.get('USER_CACHE_EXPIRE', 300))
+
+user_cache_negative_expire = int(os.environ.get('USER_CACHE_NEGATIVE_EXPIRE', 10))
+
+analytics_cache_expire = int(os.environ.get('ANALYTICS_CACHE_EXPIRE', 3600))
\ No newline at end of file
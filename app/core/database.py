@@ -1,29 +1,133 @@
-from datetime import datetime
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import AsyncIterator, Optional
 from decimal import Decimal
 
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Enum, Integer, String, ForeignKey, DateTime, Numeric, func
+from sqlalchemy import event, Enum, Integer, String, ForeignKey, Date, DateTime, Numeric, Index, UniqueConstraint, func
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy_utils import EmailType
 from redis.asyncio import Redis
 
-from app.core.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from app.core.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, db_settings, logger
+from app.core.metrics import (
+    instrument_pool, 
+    redis_command_duration_seconds, 
+    db_pool_checkout_wait_seconds, 
+    db_pool_checkout_timeouts_total,
+    db_replica_fallbacks_total,
+    )
+from app.core.tracing import instrument_engine, span
+from app.core import query_stats
 
 
 DB_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
 
-engine = create_async_engine(DB_URL)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            db_pool_checkout_timeouts_total.inc()
+            raise
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started)
+
+
+def make_engine(url: str):
+    return create_async_engine(
+        url, 
+        poolclass=TimedQueuePool,
+        pool_size=db_settings.pool_size,
+        max_overflow=db_settings.max_overflow,
+        pool_timeout=db_settings.pool_timeout,
+        pool_recycle=db_settings.pool_recycle,
+        pool_pre_ping=db_settings.pool_pre_ping,
+        connect_args={
+            'statement_cache_size': db_settings.statement_cache_size,
+            'prepared_statement_cache_size': db_settings.statement_cache_size,
+            'server_settings': {'statement_timeout': str(db_settings.statement_timeout_ms)},
+            },
+        )
+
+
+engine = make_engine(DB_URL)
+
+instrument_pool(engine.pool)
+
+instrument_engine(engine.sync_engine)
+
+query_stats.instrument_engine(engine.sync_engine)
 
 
 SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
 
 
+class ReadReplica:
+    # After a failure reads go to the primary for `retry_interval` seconds; the next read
+    # after that checks a connection out again, and pool_pre_ping's SELECT 1 is the probe.
+
+    def __init__(self, sessionmaker: async_sessionmaker, retry_interval: float):
+        self.sessionmaker = sessionmaker
+        self.retry_interval = retry_interval
+        self.down_until = 0.0
+
+    def mark_down(self, exc: BaseException):
+        self.down_until = time.monotonic() + self.retry_interval
+        db_replica_fallbacks_total.inc()
+        logger.warning(f'Read replica unavailable, reading from the primary: {exc!r}')
+
+    def owns(self, session: AsyncSession) -> bool:
+        return session.bind is self.sessionmaker.kw['bind']
+
+    async def session(self) -> Optional[AsyncSession]:
+        if time.monotonic() < self.down_until:
+            return None
+        session = self.sessionmaker()
+        try:
+            await session.connection()
+        except (DBAPIError, OSError, PoolTimeoutError) as exc:
+            await session.close()
+            self.mark_down(exc)
+            return None
+        return session
+
+
+read_replica: Optional[ReadReplica] = None
+
+if db_settings.replica_url:
+    replica_engine = make_engine(db_settings.replica_url)
+    instrument_engine(replica_engine.sync_engine)
+    query_stats.instrument_engine(replica_engine.sync_engine)
+    read_replica = ReadReplica(
+        async_sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False),
+        db_settings.replica_retry_interval,
+        )
+
+    @event.listens_for(replica_engine.sync_engine, 'handle_error')
+    def replica_error(exception_context):
+        if exception_context.is_disconnect:
+            read_replica.mark_down(exception_context.original_exception)
+
+
+@asynccontextmanager
+async def read_session(primary: bool = False) -> AsyncIterator[AsyncSession]:
+    replica = None if primary or read_replica is None else await read_replica.session()
+    async with replica or SessionLocal() as session:
+        yield session
+
+
 type_category = Enum('income', 'expenses', name='categorytype')
 
 
 class Base(DeclarativeBase):
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, unique=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
 
 class User(Base):
@@ -39,6 +143,7 @@ class User(Base):
 
 class Category(Base):   
     __tablename__ = 'categories'
+    __table_args__ = (UniqueConstraint('id_user', 'name', name='uq_categories_id_user_name'),)
     name: Mapped[str] = mapped_column(String(30))
     type: Mapped[str] = mapped_column(type_category, nullable=False)
     description: Mapped[str] = mapped_column(String(50))
@@ -46,7 +151,14 @@ class Category(Base):
 
 
 class Transaction(Base):  
+    # In Postgres the table is range-partitioned by month on `date` with primary key (id, date),
+    # see migration 5c2e8b9f4a13; filters on the raw `date` column let the planner prune partitions.
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('ix_transactions_id_user_date_id', 'id_user', 'date', 'id'),
+        Index('ix_transactions_id_user_type_date', 'id_user', 'type', 'date'),
+        Index('ix_transactions_id_category', 'id_category'),
+        )
     id_user: Mapped[int] = mapped_column(ForeignKey('users.id'))
     amount: Mapped[Decimal] = mapped_column(Numeric(11, 2))
     type: Mapped[str] = mapped_column(type_category, nullable=False)
@@ -55,13 +167,57 @@ class Transaction(Base):
     id_category: Mapped[int] = mapped_column(ForeignKey('categories.id', ondelete='SET NULL'), nullable=True)
 
 
+class UserBalance(Base):
+    # Running totals kept in step with transactions by TransactionRepository.
+    __tablename__ = 'user_balances'
+    id_user: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), unique=True)
+    income: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=0, server_default='0')
+    expenses: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=0, server_default='0')
+
+
+class MonthlyRollup(Base):
+    # Per (user, category, month, type) sums, kept in step with transactions by TransactionRepository.
+    __tablename__ = 'monthly_rollups'
+    __table_args__ = (
+        UniqueConstraint(
+            'id_user', 'id_category', 'month', 'type', 
+            name='uq_monthly_rollups_key', 
+            postgresql_nulls_not_distinct=True,
+            ),
+        Index('ix_monthly_rollups_id_category', 'id_category'),
+        )
+    id_user: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    id_category: Mapped[Optional[int]] = mapped_column(ForeignKey('categories.id', ondelete='CASCADE'), nullable=True)
+    month: Mapped[date] = mapped_column(Date)
+    type: Mapped[str] = mapped_column(type_category, nullable=False)
+    total: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=0, server_default='0')
+    count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+
+
+class ArchivedMonth(Base):
+    # Months whose transaction partition was detached; their monthly_rollups rows are kept as the only record.
+    __tablename__ = 'archived_months'
+    month: Mapped[date] = mapped_column(Date, unique=True)
+
+
 async def get_async_session():
     async with SessionLocal() as session:
         yield session
 
 
+class InstrumentedRedis(Redis):
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with span(f'redis {str(args[0]).upper()}'):
+                return await super().execute_command(*args, **options)
+        finally:
+            redis_command_duration_seconds.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+
 async def get_redis():
-    redis_app = await Redis.from_url('redis://redis:6379', decode_responses=True)
+    redis_app = await InstrumentedRedis.from_url('redis://redis:6379', decode_responses=True)
     try:
         yield redis_app
     finally:
@@ -3,14 +3,17 @@ from functools import wraps
 from fastapi import Depends, APIRouter
 
 from app.schemas.user import CategoryDepends, TransactionDepends
-from app.core.redis import redis_update_categories
+from app.core.redis import redis_update_categories, invalidate_analytics, mark_recent_write
 from app.core.tasks import process_task_celery
+from app.core.tracing import span
 
 
 def update_redis_cache(func: Callable[..., Coroutine[Any, Any, dict]]):
     @wraps(func)
     async def wrapper(*args, d: CategoryDepends = Depends(), **kwargs):
         result = await func(*args, d=d, **kwargs)
+        await invalidate_analytics(d.redis_app, d.user_id)
+        await mark_recent_write(d.redis_app, d.user_id)
         if await d.redis_app.get(f'Categories user_id: {d.user_id}'): 
             await redis_update_categories(d.session, d.redis_app, d.user_id)
         return result
@@ -25,7 +28,10 @@ class TasksRouter(APIRouter):
             @wraps(endpoint)
             async def wrapped_endpoint(d: TransactionDepends = Depends(), *args, **kwargs):
                 result = await endpoint(d=d, *args, **kwargs)
-                process_task_celery.delay(d.user_id)
+                await invalidate_analytics(d.redis_app, d.user_id)
+                await mark_recent_write(d.redis_app, d.user_id)
+                with span('celery publish process_task_celery'):
+                    process_task_celery.delay(d.user_id)
                 return result
             endpoint_to_use = wrapped_endpoint
         else:
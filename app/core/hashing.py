@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from fastapi import status
+from passlib.hash import pbkdf2_sha256
+
+from app.core.config import PasswordHashing, BaseAppException, password_hashing, logger
+from app.core.metrics import password_hash_duration_seconds, password_hash_rejected_total
+
+
+class HashStats:
+
+    def __init__(self):
+        self.count = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, wait: float, run: float):
+        self.count += 1
+        self.wait_seconds += wait
+        self.run_seconds += run
+        self.max_seconds = max(self.max_seconds, wait + run)
+
+
+def calibrate_rounds(target_ms: float, sample_rounds: int = 20000, samples: int = 3) -> int:
+    # Time a few hashes at a known cost and scale linearly: pbkdf2 cost is proportional to rounds.
+    handler = pbkdf2_sha256.using(rounds=sample_rounds)
+    best = float('inf')
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash('calibration-password')
+        best = min(best, time.perf_counter() - started)
+    rounds = int(sample_rounds * target_ms / 1000 / best)
+    return max(1000, round(rounds, -3))
+
+
+class PasswordHasher:
+    # hashlib.pbkdf2_hmac releases the GIL, so a small thread pool gives real
+    # parallelism without the pickling cost of a process pool.
+
+    def __init__(self, settings: PasswordHashing):
+        self.settings = settings
+        self.executor = ThreadPoolExecutor(max_workers=settings.workers, thread_name_prefix='password-hash')
+        self.in_flight = 0
+        self.stats = {'hash': HashStats(), 'verify': HashStats()}
+        self.rounds = settings.rounds
+        if self.rounds is None and settings.target_ms:
+            self.rounds = calibrate_rounds(settings.target_ms)
+            logger.info(f'Password hash rounds calibrated to {self.rounds} for {settings.target_ms} ms')
+        if self.rounds is None:
+            self.rounds = pbkdf2_sha256.default_rounds
+        self.handler = pbkdf2_sha256.using(rounds=self.rounds)
+
+    @property
+    def capacity(self) -> int:
+        return self.settings.workers + self.settings.max_queue
+
+    async def hash(self, password: str) -> str:
+        return await self._run('hash', self.handler.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run('verify', self.handler.verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        # Only upgrades: calibrated rounds vary a little between workers and restarts,
+        # and a stronger stored hash is never worth rewriting.
+        try:
+            return pbkdf2_sha256.from_string(hashed_password).rounds < self.rounds
+        except ValueError:
+            return False
+
+    async def _run(self, operation: str, func: Callable, *args):
+        stats = self.stats[operation]
+        if self.in_flight >= self.capacity:
+            stats.rejected += 1
+            password_hash_rejected_total.labels(operation).inc()
+            logger.warning(f'Password hash queue is full ({self.in_flight}), {operation} rejected')
+            raise BaseAppException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+                message='Server is busy, try again later',
+                )
+        self.in_flight += 1
+        queued_at = time.perf_counter()
+        timing = {}
+
+        def timed():
+            timing['started'] = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timing['finished'] = time.perf_counter()
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, timed)
+        finally:
+            self.in_flight -= 1
+            if 'finished' in timing:
+                wait, run = timing['started'] - queued_at, timing['finished'] - timing['started']
+                stats.observe(wait, run)
+                password_hash_duration_seconds.labels(operation, 'wait').observe(wait)
+                password_hash_duration_seconds.labels(operation, 'run').observe(run)
+
+
+password_hasher = PasswordHasher(password_hashing)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the pbkdf2 rounds that take the target time on this machine')
+    parser.add_argument('--target-ms', type=float, default=50)
+    args = parser.parse_args()
+    print(f'PASSWORD_HASH_ROUNDS={calibrate_rounds(args.target_ms)}')
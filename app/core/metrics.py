@@ -0,0 +1,73 @@
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from sqlalchemy.pool import Pool
+
+
+http_requests_total = Counter(
+    'http_requests_total', 
+    'HTTP requests by route template and status', 
+    ['method', 'route', 'status'],
+    )
+
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 
+    'HTTP request latency by route template', 
+    ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests currently being served')
+
+websocket_connections = Gauge('websocket_connections', 'Open websocket connections', ['route'])
+
+db_pool_connections = Gauge('db_pool_connections', 'Database pool connections by state', ['state'])
+
+db_pool_checkout_wait_seconds = Histogram(
+    'db_pool_checkout_wait_seconds', 
+    'Time spent waiting for a pooled database connection', 
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+    )
+
+db_pool_checkout_timeouts_total = Counter('db_pool_checkout_timeouts_total', 'Checkouts that hit pool_timeout')
+
+db_pool_saturation = Gauge('db_pool_saturation', 'Checked out connections / (pool_size + max_overflow)')
+
+db_replica_fallbacks_total = Counter('db_replica_fallbacks_total', 'Reads sent to the primary because the replica failed')
+
+redis_command_duration_seconds = Histogram(
+    'redis_command_duration_seconds', 
+    'Redis command latency', 
+    ['command'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+
+db_queries_per_request = Histogram(
+    'db_queries_per_request', 
+    'SQL statements executed per HTTP request', 
+    ['route'],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20, 50),
+    )
+
+db_slow_queries_total = Counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS', ['route'])
+
+password_hash_duration_seconds = Histogram(
+    'password_hash_duration_seconds', 
+    'Time spent in the password hash pool', 
+    ['operation', 'phase'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    )
+
+password_hash_rejected_total = Counter('password_hash_rejected_total', 'Hash calls rejected with 503', ['operation'])
+
+
+def instrument_pool(pool: Pool):
+    # Read at scrape time, so the request path pays nothing for these gauges.
+    if hasattr(pool, 'checkedout'):
+        db_pool_connections.labels('checked_out').set_function(pool.checkedout)
+        db_pool_connections.labels('idle').set_function(pool.checkedin)
+        db_pool_connections.labels('overflow').set_function(pool.overflow)
+        db_pool_connections.labels('size').set_function(pool.size)
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        db_pool_saturation.set_function(lambda: pool.checkedout() / capacity if capacity else 0)
+
+
+registry = REGISTRY
@@ -0,0 +1,196 @@
+import logging
+import random
+import re
+import time
+
+import jwt
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import logger, log_settings, body_log_settings
+from app.core.metrics import (
+    http_requests_total, 
+    http_request_duration_seconds, 
+    http_requests_in_flight, 
+    websocket_connections,
+    )
+from app.core.security import request_token_claims
+from app.core.tracing import current_trace_id
+from app.core import query_stats
+
+
+RESPONSE_PREVIEW_SIZE = 50
+
+
+def sensitive_pattern(fields: list[str]) -> re.Pattern:
+    names = '|'.join(re.escape(field) for field in fields)
+    # JSON string values ("password": "...") and form/query values (password=...)
+    return re.compile(rf'("(?:{names})"\s*:\s*)"(?:[^"\\]|\\.)*"?|(\b(?:{names})=)[^&\s]*')
+
+
+SENSITIVE = sensitive_pattern(body_log_settings.sensitive_fields)
+
+
+def mask_sensitive(text: str) -> str:
+    return SENSITIVE.sub(lambda m: f'{m.group(1)}"***"' if m.group(1) else f'{m.group(2)}***', text)
+
+
+def format_body(body: bytes, truncated: bool) -> str:
+    if not body:
+        return '[empty]'
+    try:
+        text = body.decode()
+    except UnicodeDecodeError:
+        if not truncated:
+            return '[binary_data]'
+        text = body.decode(errors='ignore')
+    text = mask_sensitive(text)
+    return f'{text}...[truncated]' if truncated else text
+
+
+class LoggingMiddleware:
+    # Logs requests and responses as the messages pass through, without
+    # buffering the response or rebuilding it, so streaming keeps working.
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        queries = query_stats.start_request(scope)
+        request = Request(scope)
+        prefix = ''
+        extra = {'method': request.method, 'path': request.url.path, 'trace_id': current_trace_id()}
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer'):
+            id_user = None
+            try:
+                id_user = request_token_claims(request, auth_header.partition(' ')[2]).get('sub')
+            except jwt.PyJWTError:
+                pass
+            prefix = f'id: {id_user} - '
+            extra['user_id'] = id_user
+        body_limit = body_log_settings.routes.get(request.url.path, body_log_settings.max_bytes)
+        log_body = request.method in ('POST', 'PUT', 'DELETE')
+        capture_body = log_body and body_limit > 0 and logger.isEnabledFor(logging.INFO)
+        captured = 0
+        truncated = False
+        # Successful GETs are the bulk of the traffic; only a sample of them is logged.
+        sampled = request.method != 'GET' or random.random() < log_settings.success_get_sample_rate
+        request_logged = False
+        chunks = []
+
+        def log_request():
+            nonlocal request_logged
+            if request_logged or not logger.isEnabledFor(logging.INFO):
+                return
+            request_logged = True
+            if capture_body:
+                body = format_body(b''.join(chunks), truncated)
+                logger.info(f'{prefix}Запрос: {request.method} {request.url} {body}', extra=extra)
+            else:
+                logger.info(f'{prefix}Запрос: {request.method} {request.url}', extra=extra)
+
+        async def receive_wrapper() -> Message:
+            nonlocal captured, truncated
+            message = await receive()
+            if log_body and message['type'] == 'http.request' and not request_logged:
+                if capture_body and not truncated:
+                    body = message.get('body', b'')
+                    chunk = body[:body_limit - captured]
+                    chunks.append(chunk)
+                    captured += len(chunk)
+                    truncated = len(body) > len(chunk) or captured >= body_limit and message.get('more_body', False)
+                if not message.get('more_body', False):
+                    log_request()
+            return message
+
+        status_code = None
+        size = 0
+        preview = b''
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, size, preview, sampled
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                sampled = sampled or not 200 <= status_code < 300
+                if sampled:
+                    log_request()
+            elif message['type'] == 'http.response.body' and sampled:
+                body = message.get('body', b'')
+                size += len(body)
+                if len(preview) < RESPONSE_PREVIEW_SIZE:
+                    preview += body[:RESPONSE_PREVIEW_SIZE - len(preview)]
+                if not message.get('more_body', False):
+                    text = mask_sensitive(preview.decode(errors='replace')) + '...' if preview else '[empty]'
+                    logger.info(
+                        f'Ответ: {status_code} - {size} bytes - {text}', 
+                        extra={
+                            **extra, 
+                            'status': status_code, 
+                            'size': size, 
+                            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                            'db_queries': queries.count,
+                            'db_time_ms': round(queries.seconds * 1000, 2),
+                            },
+                        )
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception as exc:
+            log_request()
+            logger.error(f'500 Error: {str(exc)}', extra=extra)
+            raise
+        finally:
+            query_stats.finish_request(queries)
+
+
+class MetricsMiddleware:
+    # Labels use the matched route template, never the raw path, to keep cardinality bounded.
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'websocket':
+            return await self.websocket(scope, receive, send)
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get('route')
+            template = route.path if route is not None else 'unmatched'
+            http_request_duration_seconds.labels(scope['method'], template).observe(time.perf_counter() - started)
+            http_requests_total.labels(scope['method'], template, status_code).inc()
+
+    async def websocket(self, scope: Scope, receive: Receive, send: Send):
+        gauge = None
+
+        async def send_wrapper(message: Message):
+            nonlocal gauge
+            if message['type'] == 'websocket.accept' and gauge is None:
+                route = scope.get('route')
+                gauge = websocket_connections.labels(route.path if route is not None else 'unmatched')
+                gauge.inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if gauge is not None:
+                gauge.dec()
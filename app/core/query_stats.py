@@ -0,0 +1,79 @@
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import Scope
+
+from app.core.config import query_stats_settings, logger
+from app.core.metrics import db_queries_per_request, db_slow_queries_total
+
+
+class RequestQueries:
+    __slots__ = ('scope', 'count', 'seconds')
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get('route') if self.scope is not None else None
+        return route.path if route is not None else 'unmatched'
+
+
+request_queries: ContextVar[Optional[RequestQueries]] = ContextVar('request_queries', default=None)
+
+slow_queries: deque = deque(maxlen=query_stats_settings.slow_query_buffer)
+
+
+def start_request(scope: Scope) -> RequestQueries:
+    queries = RequestQueries(scope)
+    request_queries.set(queries)
+    return queries
+
+
+def finish_request(queries: RequestQueries):
+    db_queries_per_request.labels(queries.route).observe(queries.count)
+
+
+def parameters_shape(parameters: Any) -> Any:
+    # Types only, never values: parameters may hold emails, hashes or amounts.
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f'{len(parameters)} x {parameters_shape(parameters[0])}'
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def instrument_engine(engine: Engine):
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        queries = request_queries.get()
+        if queries is not None:
+            queries.count += 1
+            queries.seconds += elapsed
+        if elapsed * 1000 >= query_stats_settings.slow_query_ms:
+            route = queries.route if queries is not None else None
+            entry = {
+                'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'route': route,
+                'duration_ms': round(elapsed * 1000, 2),
+                'statement': ' '.join(statement.split())[:1000],
+                'parameters': parameters_shape(parameters),
+                }
+            slow_queries.append(entry)
+            db_slow_queries_total.labels(route or 'background').inc()
+            logger.warning(f"Slow query {entry['duration_ms']} ms on {route}: {entry['statement'][:200]}", extra=entry)
@@ -0,0 +1,78 @@
+import time
+import uuid
+from typing import Optional
+
+from fastapi import Request, status
+from redis.asyncio import Redis
+
+from app.core.config import BaseAppException, rate_limits, logger
+
+
+# KEYS: one sorted set per limited identity. ARGV: now_ms, window_ms, member, limit per key.
+# All windows are checked before anything is recorded, so a rejected attempt costs nothing.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        return i
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+end
+return 0
+"""
+
+
+class SlidingWindowLimiter:
+
+    def __init__(self, name: str, per_ip: int, per_email: int, window: int):
+        self.name = name
+        self.per_ip = per_ip
+        self.per_email = per_email
+        self.window = window
+
+    async def check(self, redis_app: Redis, request: Request, email: Optional[str] = None):
+        keys, limits = [], []
+        if self.per_ip and request.client:
+            keys.append(f'Rate limit {self.name} ip: {request.client.host}')
+            limits.append(self.per_ip)
+        if self.per_email and email:
+            keys.append(f'Rate limit {self.name} email: {email.lower()}')
+            limits.append(self.per_email)
+        if not keys:
+            return
+        now = int(time.time() * 1000)
+        blocked = await redis_app.eval(
+            SLIDING_WINDOW_SCRIPT, 
+            len(keys), 
+            *keys, 
+            now, 
+            self.window * 1000, 
+            f'{now}-{uuid.uuid4().hex[:8]}', 
+            *limits,
+            )
+        if blocked:
+            logger.warning(f'Rate limit exceeded: {keys[int(blocked) - 1]}')
+            raise BaseAppException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS, 
+                message='Too many attempts, try again later',
+                )
+
+
+login_limiter = SlidingWindowLimiter(
+    'login', 
+    rate_limits.login_per_ip, 
+    rate_limits.login_per_email, 
+    rate_limits.window,
+    )
+
+registration_limiter = SlidingWindowLimiter(
+    'registration', 
+    rate_limits.registration_per_ip, 
+    rate_limits.registration_per_email, 
+    rate_limits.window,
+    )
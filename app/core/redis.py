@@ -1,13 +1,27 @@
 import json
-from typing import Optional
+import time
+from typing import Any, Awaitable, Callable, Optional
 
 from fastapi import status
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 
 from app.repositories.category import CategoryRepository
-from app.core.config import BaseAppException
-from app.core.config import redis_expire
+from app.repositories.user import UserRepository
+from app.core.cache import LRUCache
+from app.core.config import BaseAppException, db_settings
+from app.core.database import read_replica
+from app.core.config import redis_expire, user_cache_expire, user_cache_negative_expire, analytics_cache_expire
+
+
+user_exists_cache = LRUCache(maxsize=10000)
+
+
+def cache_expire(session: AsyncSession) -> int:
+    # Entries filled from a lagging replica expire together with the read-your-writes window.
+    if read_replica is not None and read_replica.owns(session):
+        return db_settings.read_your_writes
+    return redis_expire
 
 
 async def redis_update_categories(session: AsyncSession, redis_app: Redis, user_id: int) -> Optional[list]:
@@ -21,5 +35,57 @@ async def redis_update_categories(session: AsyncSession, redis_app: Redis, user_
         "type": cat.type,
         "description": cat.description,
         }for cat in categories]
-    await redis_app.setex(f'Categories user_id: {user_id}', redis_expire, json.dumps(categories_dict))
-    return categories
\ No newline at end of file
+    await redis_app.setex(f'Categories user_id: {user_id}', cache_expire(session), json.dumps(categories_dict))
+    return categories
+
+
+async def redis_user_exists(session: AsyncSession, redis_app: Redis, user_id: int) -> bool:
+    exists = user_exists_cache.get(user_id)
+    if exists is not None:
+        return exists
+    cached = await redis_app.get(f'User exists: {user_id}')
+    if cached in ('0', '1'):
+        exists = cached == '1'
+    else:
+        exists = await UserRepository.checking_user_id(session, user_id) is not None
+        await redis_app.setex(
+            f'User exists: {user_id}', 
+            user_cache_expire if exists else user_cache_negative_expire, 
+            '1' if exists else '0',
+            )
+    ttl = user_cache_expire if exists else user_cache_negative_expire
+    user_exists_cache.set(user_id, exists, expires_at=time.time() + ttl)
+    return exists
+
+
+async def invalidate_user_cache(redis_app: Redis, user_id: int):
+    user_exists_cache.pop(user_id)
+    await redis_app.delete(f'User exists: {user_id}', f'User information: {user_id}')
+
+
+async def redis_analytics(redis_app: Redis, user_id: int, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    # Keys embed a per-user version; writes bump it, so stale entries are simply never read again.
+    version = await redis_app.get(f'Analytics version user_id: {user_id}') or '0'
+    cache_key = f'Analytics user_id: {user_id}: v{version}: {key}'
+    cached = await redis_app.get(cache_key)
+    if cached:
+        return json.loads(cached)
+    result = await compute()
+    await redis_app.setex(cache_key, analytics_cache_expire, json.dumps(result))
+    return result
+
+
+async def invalidate_analytics(redis_app: Redis, user_id: int):
+    await redis_app.incr(f'Analytics version user_id: {user_id}')
+
+
+async def mark_recent_write(redis_app: Redis, user_id: int):
+    if read_replica is not None:
+        await redis_app.setex(f'Recent write user_id: {user_id}', db_settings.read_your_writes, '1')
+
+
+async def read_from_primary(redis_app: Redis, user_id: int) -> bool:
+    # Within the read-your-writes window the replica may not have the user's last write yet.
+    if read_replica is None:
+        return True
+    return bool(await redis_app.exists(f'Recent write user_id: {user_id}'))
@@ -1,22 +1,44 @@
-from typing import Optional
+from functools import partial
+from typing import AsyncIterator, Callable, Optional
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi import Depends, status, Header
+from fastapi import Depends, Request, status, Header
 import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
 
-from app.core.config import auth, BaseAppException
-from app.core.database import get_async_session
-from app.repositories.user import UserRepository
+from app.core.config import BaseAppException
+from app.core.tokens import token_service
+from app.core.database import get_async_session, get_redis, read_session, read_replica
+from app.core.redis import redis_user_exists, read_from_primary
 
 
 http_bearer = HTTPBearer(scheme_name='JWT Token', description='Token')
 
 
-async def decod_token(credential: HTTPAuthorizationCredentials = Depends(http_bearer)) -> Optional[int]:
+def request_token_claims(request: Request, token: str) -> dict:
+    state = request.state
+    if getattr(state, 'token', None) != token:
+        state.token = token
+        state.token_claims = None
+        state.token_error = None
+        try:
+            state.token_claims = token_service.decode(token, verify_exp=False)
+        except jwt.PyJWTError as exc:
+            state.token_error = exc
+    if state.token_error is not None:
+        raise state.token_error
+    return state.token_claims
+
+
+async def decod_token(
+        request: Request, 
+        credential: HTTPAuthorizationCredentials = Depends(http_bearer)
+        ) -> Optional[int]:
     try:
         token = credential.credentials
-        decod = jwt.decode(token, auth.public_key_path.read_text(), auth.algorithm)
+        decod = request_token_claims(request, token)
+        token_service.check_exp(decod)
         type_token = decod.get('type') 
         id: str = decod.get('sub')
         if not id:
@@ -32,24 +54,50 @@ async def decod_token(credential: HTTPAuthorizationCredentials = Depends(http_be
 
 async def get_id_current_user(
         id: int = Depends(decod_token), 
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_async_session),
+        redis_app: Redis = Depends(get_redis)
         ) -> Optional[int]:
-    user_id = await UserRepository.checking_user_id(session, id)
-    if not user_id:
+    if not await redis_user_exists(session, redis_app, id):
         raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='This user does not exist')
-    return user_id
+    return id
+
+
+async def prefer_primary(
+        user_id: int = Depends(get_id_current_user),
+        redis_app: Redis = Depends(get_redis)
+        ) -> bool:
+    return await read_from_primary(redis_app, user_id)
+
+
+async def get_read_session(
+        primary: bool = Depends(prefer_primary),
+        session: AsyncSession = Depends(get_async_session)
+        ) -> AsyncIterator[AsyncSession]:
+    replica = None if primary else await read_replica.session()
+    if replica is None:
+        yield session
+        return
+    async with replica:
+        yield replica
+
+
+def get_read_sessionmaker(primary: bool = Depends(prefer_primary)) -> Callable:
+    # For streaming responses: yield dependencies are closed before the body is sent,
+    # so the stream opens its own session from this factory.
+    return partial(read_session, primary)
 
 
 async def token_verification(
+        request: Request,
         access_token: HTTPAuthorizationCredentials = Depends(http_bearer),
         refresh_token: str = Header(..., alias='Refresh-Token')
         ) -> Optional[str]:
     try:
         token = access_token.credentials
-        decod = jwt.decode(token, auth.public_key_path.read_text(), auth.algorithm, options={'verify_exp': False})
+        decod = request_token_claims(request, token)
         access_id: str = decod.get('sub')
         access_type = decod.get('type')
-        decod = jwt.decode(refresh_token, auth.public_key_path.read_text(), auth.algorithm)
+        decod = token_service.decode(refresh_token)
         refresh_id: str = decod.get('sub')
         refresh_type = decod.get('type')
     except jwt.PyJWTError:
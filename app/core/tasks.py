@@ -1,17 +1,23 @@
 import os
+import re
+from datetime import date, datetime, timezone
 from typing import Optional
 
 from openpyxl import Workbook
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, join
+from sqlalchemy import select, join, insert, update, delete, func, case, text, literal, union_all, Date
 
 from app.core.celery_app import celery_app
-from app.core.database import Transaction, Category
+from app.core.config import logger, partition_settings
+from app.core.database import Transaction, Category, User, UserBalance, MonthlyRollup, ArchivedMonth
+from app.core.tracing import instrument_engine
 
 
 sync_engine = create_engine("postgresql://postgres:654321@db:5432/finance_db")
 
+instrument_engine(sync_engine)
+
 SyncSession = sessionmaker(bind=sync_engine)
 
 
@@ -29,6 +35,12 @@ def process_task_celery(user_id) -> Optional[str]:
             ).select_from(j).where(Transaction.id_user == user_id)
         result = session.execute(query)
         result = result.mappings().all()
+        monthly = session.execute(
+            select(MonthlyRollup.month, Category.name, MonthlyRollup.type, MonthlyRollup.total, MonthlyRollup.count)
+            .outerjoin(Category, MonthlyRollup.id_category == Category.id)
+            .where(MonthlyRollup.id_user == user_id, MonthlyRollup.count > 0)
+            .order_by(MonthlyRollup.month, Category.name)
+            ).all()
     wb = Workbook()
     ws = wb.active
     ws['A1'] = '№'
@@ -42,10 +54,176 @@ def process_task_celery(user_id) -> Optional[str]:
             ws.append((x, row['name'], -(row['amount'])))
         x += 1
     ws.append(['', 'Total:', f'=ROUND(SUM(C2:C{x}), 2)'])
+    ws_monthly = wb.create_sheet('Monthly')
+    ws_monthly.append(('month', 'name', 'type', 'amount', 'count'))
+    for month, name, type, total, count in monthly:
+        ws_monthly.append((month, name or '-', type, total, count))
     folder_path = 'reports'
     file_name = f'report_user_id_{user_id}.xlsx'
     full_path = os.path.join(folder_path, file_name)
     wb.save(full_path)
     return f'Report created: {full_path}'
 
-    
\ No newline at end of file
+    
+
+
+def archive_boundary(session) -> Optional[datetime]:
+    # Transactions before this point live only in the rollups of archived (detached) months.
+    last = session.execute(select(func.max(ArchivedMonth.month))).scalar()
+    if last is None:
+        return None
+    first = add_months(last, 1)
+    return datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+
+
+def actual_totals(user_id: int, since: Optional[datetime] = None):
+    rows = select(Transaction.type, Transaction.amount).where(Transaction.id_user == user_id)
+    if since is not None:
+        rows = union_all(
+            rows.where(Transaction.date >= since),
+            select(MonthlyRollup.type, MonthlyRollup.total).where(MonthlyRollup.id_user == user_id, MonthlyRollup.month < since.date()),
+            )
+    rows = rows.subquery()
+    income = func.coalesce(func.sum(case((rows.c.type == 'income', rows.c.amount))), 0)
+    expenses = func.coalesce(func.sum(case((rows.c.type == 'expenses', rows.c.amount))), 0)
+    return select(income.label('income'), expenses.label('expenses'))
+
+
+def lock_balance(user_id: int):
+    # Every transaction write updates this row in its own database transaction, so holding it
+    # serializes one user's writers without blocking anyone else.
+    return select(UserBalance.income, UserBalance.expenses).where(UserBalance.id_user == user_id).with_for_update()
+
+
+@celery_app.task
+def reconcile_balances() -> dict:
+    # Recomputes balances from transactions one user at a time, repairing (and logging) any drift.
+    checked = 0
+    drifted = []
+    with SyncSession() as session:
+        user_ids = session.execute(select(User.id).order_by(User.id)).scalars().all()
+        session.commit()
+        for user_id in user_ids:
+            stored = session.execute(lock_balance(user_id)).one_or_none()
+            actual = tuple(session.execute(actual_totals(user_id, archive_boundary(session))).one())
+            if stored is not None:
+                checked += 1
+                if tuple(stored) == actual:
+                    session.commit()
+                    continue
+            drifted.append(user_id)
+            logger.warning(f'Balance drift for user {user_id}: stored {stored and tuple(stored)}, actual {actual}')
+            income, expenses = actual
+            if stored is None:
+                session.execute(insert(UserBalance).values(id_user=user_id, income=income, expenses=expenses))
+            else:
+                session.execute(
+                    update(UserBalance).where(UserBalance.id_user == user_id).values(income=income, expenses=expenses)
+                    )
+            session.commit()
+    return {'checked': checked, 'drifted': drifted}
+
+
+@celery_app.task
+def rebuild_rollups(user_id: Optional[int] = None) -> int:
+    # One user per database transaction, serialized against that user's writers by the balance row lock
+    # (rollup deltas are always applied in the same transaction as the balance update or lock).
+    # Archived months have no transactions left to rebuild from, so their rollups are kept as they are.
+    month = func.date_trunc('month', func.timezone('UTC', Transaction.date)).cast(Date)
+    key = (Transaction.id_user, Transaction.id_category, month, Transaction.type)
+    rebuilt = 0
+    with SyncSession() as session:
+        if user_id is None:
+            user_ids = session.execute(select(User.id).order_by(User.id)).scalars().all()
+            session.commit()
+        else:
+            user_ids = [user_id]
+        for current in user_ids:
+            session.execute(lock_balance(current))
+            stale = delete(MonthlyRollup).where(MonthlyRollup.id_user == current)
+            totals = select(*key, func.sum(Transaction.amount), func.count()).where(Transaction.id_user == current).group_by(*key)
+            since = archive_boundary(session)
+            if since is not None:
+                stale = stale.where(MonthlyRollup.month >= since.date())
+                totals = totals.where(Transaction.date >= since)
+            session.execute(stale)
+            result = session.execute(insert(MonthlyRollup).from_select(
+                ['id_user', 'id_category', 'month', 'type', 'total', 'count'], 
+                totals,
+                ))
+            session.commit()
+            rebuilt += result.rowcount
+    return rebuilt
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'transactions_{month:%Y_%m}'
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = re.fullmatch(r'transactions_(\d{4})_(\d{2})', name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def archive_month(session, month: date):
+    # Refreshes the month's rollups from its partition and records it as archived, just before it is detached.
+    following = add_months(month, 1)
+    lower = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    upper = datetime(following.year, following.month, 1, tzinfo=timezone.utc)
+    key = (Transaction.id_user, Transaction.id_category, Transaction.type)
+    session.execute(delete(MonthlyRollup).where(MonthlyRollup.month == month))
+    session.execute(insert(MonthlyRollup).from_select(
+        ['id_user', 'id_category', 'type', 'month', 'total', 'count'],
+        select(*key, literal(month, Date), func.sum(Transaction.amount), func.count())
+        .where(Transaction.date >= lower, Transaction.date < upper)
+        .group_by(*key),
+        ))
+    session.execute(insert(ArchivedMonth).values(month=month))
+
+
+@celery_app.task
+def maintain_transaction_partitions(
+        months_ahead: int = partition_settings.months_ahead, 
+        retention_months: int = partition_settings.retention_months,
+        ) -> dict:
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    created, detached = [], []
+    with SyncSession() as session:
+        existing = set(session.execute(text(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'transactions'::regclass"
+            )).scalars())
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            lower, upper = f"'{month} 00:00:00+00'", f"'{add_months(month, 1)} 00:00:00+00'"
+            # Rows that already fell into the default partition for this month move with it,
+            # otherwise ATTACH would fail on the default partition's constraint.
+            session.execute(text(f'CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            session.execute(text(
+                f'WITH moved AS (DELETE FROM transactions_default WHERE date >= {lower} AND date < {upper} RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved'
+                ))
+            session.execute(text(f'ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})'))
+            created.append(name)
+        if retention_months > 0:
+            cutoff = add_months(current, -retention_months)
+            for name in sorted(existing):
+                month = partition_month(name)
+                if month is not None and month < cutoff:
+                    # Writers to the month are held off until the detach commits, so the snapshot stays exact.
+                    session.execute(text(f'LOCK TABLE {name} IN SHARE MODE'))
+                    archive_month(session, month)
+                    session.execute(text(f'ALTER TABLE transactions DETACH PARTITION {name}'))
+                    detached.append(name)
+        session.commit()
+    if created or detached:
+        logger.info(f'Transaction partitions created: {created}, detached: {detached}')
+    return {'created': created, 'detached': detached}
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+from app.core.cache import LRUCache
+from app.core.config import AuthJWT, auth
+
+
+class KeyFile:
+    # Parsed file content that is re-read only when the file on disk changes.
+    # The stat() itself is throttled to one call per `check_interval` seconds.
+
+    def __init__(self, path: Path, loader: Callable[[bytes], Any], check_interval: float):
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+        self._key = None
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+
+    def get(self) -> tuple[Any, bool]:
+        now = time.monotonic()
+        if self._key is not None and now - self._checked_at < self.check_interval:
+            return self._key, False
+        self._checked_at = now
+        mtime = self.path.stat().st_mtime_ns
+        if self._key is not None and mtime == self._mtime:
+            return self._key, False
+        self._key = self.loader(self.path.read_bytes())
+        self._mtime = mtime
+        return self._key, True
+
+
+class Key(NamedTuple):
+    kid: Optional[str]
+    algorithm: str
+    signing: Any
+    verifying: Any
+
+
+class KeySet:
+
+    def __init__(self, keys: list[Key], active_kid: Optional[str] = None):
+        if not keys:
+            raise ValueError('Key set is empty')
+        self.keys = {key.kid: key for key in keys}
+        self.active = self.keys[active_kid] if active_kid else keys[0]
+
+    def signing_key(self) -> Key:
+        if self.active.signing is None:
+            raise jwt.InvalidKeyError(f'No private key for kid {self.active.kid}')
+        return self.active
+
+    def verifying_key(self, kid: Optional[str]) -> Key:
+        key = self.keys.get(kid)
+        if key is None and kid is None and len(self.keys) == 1:
+            key = self.active
+        if key is None:
+            raise jwt.InvalidTokenError(f'Unknown key id: {kid}')
+        return key
+
+
+def public_part(key: Any) -> Any:
+    return key.public_key() if hasattr(key, 'public_key') else key
+
+
+def load_jwks(data: bytes) -> KeySet:
+    content = json.loads(data)
+    keys = []
+    for jwk in content['keys']:
+        key = jwt.PyJWK(jwk).key
+        private = key if jwk.get('d') or jwk.get('k') else None
+        keys.append(Key(jwk.get('kid'), jwk['alg'], private, public_part(key)))
+    return KeySet(keys, content.get('active'))
+
+
+class PemKeyBackend:
+
+    def __init__(self, settings: AuthJWT):
+        self.settings = settings
+        self.private_key = KeyFile(
+            settings.private_key_path,
+            lambda data: load_pem_private_key(data, password=None),
+            settings.key_check_interval,
+            )
+        self.public_key = KeyFile(settings.public_key_path, load_pem_public_key, settings.key_check_interval)
+        self.key_set: Optional[KeySet] = None
+
+    def get(self) -> tuple[KeySet, bool]:
+        public, public_reloaded = self.public_key.get()
+        private = None
+        private_reloaded = False
+        if self.settings.private_key_path.exists():
+            private, private_reloaded = self.private_key.get()
+        reloaded = self.key_set is None or public_reloaded or private_reloaded
+        if reloaded:
+            self.key_set = KeySet([Key(self.settings.key_id, self.settings.algorithm, private, public)])
+        return self.key_set, reloaded
+
+
+class SecretKeyBackend:
+
+    def __init__(self, settings: AuthJWT):
+        if not settings.secret_key:
+            raise ValueError('SECRET_KEY_JWT is required for the secret key backend')
+        secret = settings.secret_key.encode()
+        self.key_set = KeySet([Key(settings.key_id, settings.algorithm, secret, secret)])
+        self.loaded = False
+
+    def get(self) -> tuple[KeySet, bool]:
+        reloaded = not self.loaded
+        self.loaded = True
+        return self.key_set, reloaded
+
+
+class JwksKeyBackend:
+
+    def __init__(self, settings: AuthJWT):
+        self.jwks = KeyFile(settings.jwks_path, load_jwks, settings.key_check_interval)
+
+    def get(self) -> tuple[KeySet, bool]:
+        return self.jwks.get()
+
+
+key_backends = {'pem': PemKeyBackend, 'secret': SecretKeyBackend, 'jwks': JwksKeyBackend}
+
+
+class TokenService:
+
+    def __init__(self, settings: AuthJWT):
+        self.settings = settings
+        self.backend = key_backends[settings.key_backend](settings)
+        self.verified = LRUCache(settings.token_cache_size)
+
+    def _key_set(self) -> KeySet:
+        key_set, reloaded = self.backend.get()
+        if reloaded:
+            self.verified.clear()
+        return key_set
+
+    def decode(self, token: str, verify_exp: bool = True) -> dict:
+        key_set = self._key_set()
+        claims = self.verified.get(token)
+        if claims is None:
+            key = key_set.verifying_key(jwt.get_unverified_header(token).get('kid'))
+            claims = jwt.decode(
+                token,
+                key.verifying,
+                algorithms=[key.algorithm],
+                options={'verify_exp': False},
+                )
+            exp = claims.get('exp')
+            if exp is None or exp > time.time():
+                self.verified.set(token, claims, expires_at=exp)
+        if verify_exp:
+            self.check_exp(claims)
+        return claims
+
+    @staticmethod
+    def check_exp(claims: dict):
+        if 'exp' in claims and claims['exp'] <= time.time():
+            raise jwt.ExpiredSignatureError('Signature has expired')
+
+    def encode(self, payload: dict) -> str:
+        key = self._key_set().signing_key()
+        headers = {'kid': key.kid} if key.kid else None
+        return jwt.encode(payload, key.signing, algorithm=key.algorithm, headers=headers)
+
+
+token_service = TokenService(auth)
+
+
+def generate_jwk(algorithm: str, kid: str) -> dict:
+    if algorithm == 'RS256':
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == 'ES256':
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == 'EdDSA':
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == 'HS256':
+        key = os.urandom(32)
+    else:
+        raise ValueError(f'Unsupported algorithm: {algorithm}')
+    jwk = get_default_algorithms()[algorithm].to_jwk(key, as_dict=True)
+    jwk.update({'kid': kid, 'alg': algorithm})
+    return jwk
+
+
+def write_private(path: Path, data: bytes):
+    # Owner-only from the first byte, and swapped in whole so a reloading worker never sees half a file.
+    temporary = path.with_name(path.name + '.tmp')
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.fchmod(fd, 0o600)
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    os.replace(temporary, path)
+
+
+def rotate_jwks(path: Path, algorithm: str, kid: str, keep: int = 2) -> dict:
+    # The new key becomes active; the previous `keep - 1` keys stay in the set
+    # so tokens signed before the rotation keep verifying until they expire.
+    content = json.loads(path.read_text()) if path.exists() else {'keys': []}
+    keys = [jwk for jwk in content['keys'] if jwk.get('kid') != kid]
+    keys.insert(0, generate_jwk(algorithm, kid))
+    content = {'active': kid, 'keys': keys[:keep]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_private(path, json.dumps(content, indent=2).encode())
+    return content
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Add a new signing key to the JWKS file and make it active')
+    parser.add_argument('kid')
+    parser.add_argument('--algorithm', default='EdDSA', choices=['RS256', 'ES256', 'EdDSA', 'HS256'])
+    parser.add_argument('--path', type=Path, default=auth.jwks_path)
+    parser.add_argument('--keep', type=int, default=2)
+    args = parser.parse_args()
+    rotate_jwks(args.path, args.algorithm, args.kid, args.keep)
+    print(f'Active key: {args.kid} ({args.algorithm}) in {args.path}')
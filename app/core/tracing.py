@@ -0,0 +1,294 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import tracing_settings, TracingSettings, logger
+
+
+current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'end', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round((self.end - self.start) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+            }
+
+
+class JsonlExporter:
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def export(self, spans: list[Span]):
+        with self.path.open('a', encoding='utf-8') as file:
+            file.writelines(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n' for span in spans)
+
+
+class OtlpHttpExporter:
+    # OTLP/HTTP with the JSON encoding, so any collector (or the stand-in below) can receive it.
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+
+    @staticmethod
+    def attribute(key: str, value) -> dict:
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def payload(self, spans: list[Span]) -> dict:
+        return {'resourceSpans': [{
+            'resource': {'attributes': [self.attribute('service.name', self.service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': 'app.core.tracing'},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(span.start),
+                    'endTimeUnixNano': str(span.end),
+                    'attributes': [self.attribute(key, value) for key, value in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+                    } for span in spans],
+                }],
+            }]}
+
+    def export(self, spans: list[Span]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self.payload(spans)).encode(),
+            headers={'Content-Type': 'application/json'},
+            )
+        urllib.request.urlopen(request, timeout=5).close()
+
+
+class SpanProcessor:
+    # Finished spans are queued and exported in batches from a background thread.
+
+    def __init__(self, exporter, batch_size: int = 256, interval: float = 2.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='span-exporter', daemon=True)
+        self.thread.start()
+
+    def on_end(self, span: Span):
+        self.queue.put(span)
+
+    def drain(self) -> list[Span]:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def flush(self):
+        while spans := self.drain():
+            try:
+                self.exporter.export(spans)
+            except Exception as exc:
+                logger.warning(f'Span export failed: {exc}')
+                return
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def shutdown(self):
+        self.stopped.set()
+        self.thread.join(timeout=self.interval + 1)
+        self.flush()
+
+
+class Tracer:
+
+    def __init__(self, settings: TracingSettings):
+        self.settings = settings
+        self.processor: Optional[SpanProcessor] = None
+        if settings.exporter == 'jsonl':
+            self.processor = SpanProcessor(JsonlExporter(settings.jsonl_path))
+        elif settings.exporter == 'otlp':
+            self.processor = SpanProcessor(OtlpHttpExporter(settings.otlp_endpoint, settings.service_name))
+        if self.processor is not None:
+            atexit.register(self.processor.shutdown)
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def start(self, name: str, trace_id: Optional[str] = None, **attributes) -> Optional[Span]:
+        parent = current_span.get()
+        if parent is not None:
+            return Span(name, parent.trace_id, parent.span_id, attributes)
+        if trace_id is None:
+            if not self.enabled or random.random() >= self.settings.sample_rate:
+                return None
+            trace_id = os.urandom(16).hex()
+        return Span(name, trace_id, attributes=attributes)
+
+    def finish(self, span: Span, error: Optional[BaseException] = None):
+        span.end = time.time_ns()
+        if error is not None:
+            span.error = repr(error)
+        if self.processor is not None:
+            self.processor.on_end(span)
+
+
+tracer = Tracer(tracing_settings)
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, **attributes):
+    # Child spans are only recorded inside an active trace; outside one this is a no-op.
+    if trace_id is None and current_span.get() is None:
+        yield None
+        return
+    new_span = tracer.start(name, trace_id, **attributes)
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as exc:
+        tracer.finish(new_span, exc)
+        raise
+    else:
+        tracer.finish(new_span)
+    finally:
+        current_span.reset(token)
+
+
+def current_trace_id() -> Optional[str]:
+    active = current_span.get()
+    return active.trace_id if active is not None else None
+
+
+def instrument_engine(engine: Engine):
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        if parent is not None:
+            context._trace_span = Span(
+                'db ' + statement.split(None, 1)[0].upper(),
+                parent.trace_id,
+                parent.span_id,
+                {'db.statement': statement[:500], 'db.executemany': executemany},
+                )
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        db_span = getattr(context, '_trace_span', None)
+        if db_span is not None:
+            db_span.attributes['db.rowcount'] = cursor.rowcount
+            tracer.finish(db_span)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        db_span = getattr(exception_context.execution_context, '_trace_span', None)
+        if db_span is not None:
+            tracer.finish(db_span, exception_context.original_exception)
+
+
+class TracingMiddleware:
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not tracer.enabled:
+            return await self.app(scope, receive, send)
+        incoming = dict(scope['headers']).get(b'x-trace-id', b'').decode('latin-1')
+        trace_id = incoming if len(incoming) == 32 and all(c in '0123456789abcdef' for c in incoming) else None
+        root = tracer.start(f"HTTP {scope['method']}", trace_id, **{'http.path': scope['path']})
+        if root is None:
+            return await self.app(scope, receive, send)
+        token = current_span.set(root)
+
+        async def send_wrapper(message: Message):
+            if message['type'] == 'http.response.start':
+                root.attributes['http.status_code'] = message['status']
+                message['headers'] = [*message.get('headers', []), (b'x-trace-id', root.trace_id.encode())]
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            route = scope.get('route')
+            if route is not None:
+                root.name = f"HTTP {scope['method']} {route.path}"
+            current_span.reset(token)
+            tracer.finish(root, error)
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    output: Path = Path('logs/otlp_spans.jsonl')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.output.open('a', encoding='utf-8') as file:
+            for resource in json.loads(body).get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    file.writelines(json.dumps(item, ensure_ascii=False) + '\n' for item in scope.get('spans', []))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for an OTLP/HTTP collector')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', type=Path, default=CollectorHandler.output)
+    args = parser.parse_args()
+    CollectorHandler.output = args.output
+    print(f'Collecting spans on :{args.port} into {args.output}')
+    HTTPServer(('0.0.0.0', args.port), CollectorHandler).serve_forever()
@@ -0,0 +1,65 @@
+from datetime import date, datetime, time, timezone
+from typing import Literal, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, literal_column, Date
+
+from app.core.database import Category, MonthlyRollup, Transaction
+
+
+def month_aligned(date_from: Optional[date], date_to: Optional[date]) -> bool:
+    return all(value is None or value.day == 1 for value in (date_from, date_to))
+
+
+def utc_start(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=timezone.utc)
+
+
+class AnalyticsRepository:
+
+    @staticmethod
+    async def totals(
+        session: AsyncSession, 
+        user_id: int, 
+        group_by: Literal['category', 'type'],
+        bucket: Optional[Literal['day', 'week', 'month']] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        ) -> list:
+        # Whole-month questions are answered from monthly_rollups; day/week buckets and
+        # ranges that cut through a month fall back to transactions (ix_transactions_id_user_date_id).
+        if bucket in (None, 'month') and month_aligned(date_from, date_to):
+            source = MonthlyRollup
+            period = MonthlyRollup.month
+            total = func.sum(MonthlyRollup.total)
+            count = func.sum(MonthlyRollup.count)
+            conditions = [MonthlyRollup.id_user == user_id]
+            if date_from is not None:
+                conditions.append(MonthlyRollup.month >= date_from)
+            if date_to is not None:
+                conditions.append(MonthlyRollup.month < date_to)
+        else:
+            source = Transaction
+            # Inlined literals, so the expression in GROUP BY is textually identical to the one selected.
+            unit = literal_column(f"'{bucket or 'day'}'")
+            period = func.date_trunc(unit, func.timezone(literal_column("'UTC'"), Transaction.date)).cast(Date)
+            total = func.sum(Transaction.amount)
+            count = func.count()
+            conditions = [Transaction.id_user == user_id]
+            if date_from is not None:
+                conditions.append(Transaction.date >= utc_start(date_from))
+            if date_to is not None:
+                conditions.append(Transaction.date < utc_start(date_to))
+        keys = [source.type.label('type')]
+        if group_by == 'category':
+            keys.insert(0, Category.name.label('category'))
+        if bucket is not None:
+            keys.insert(0, period.label('period'))
+        query = select(*keys, total.label('total'), count.label('count')).select_from(source)
+        if group_by == 'category':
+            query = query.outerjoin(Category, source.id_category == Category.id)
+        query = query.where(*conditions).group_by(*keys).order_by(*keys)
+        if source is MonthlyRollup:
+            query = query.having(count > 0)
+        result = await session.execute(query)
+        return result.mappings().all()
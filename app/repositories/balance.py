@@ -0,0 +1,51 @@
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update
+
+from app.core.database import UserBalance
+
+
+class BalanceRepository:
+
+    @staticmethod
+    async def create_balance(session: AsyncSession, user_id: int):
+        await session.execute(insert(UserBalance).values(id_user=user_id))
+
+    @staticmethod
+    async def apply_changes(
+        session: AsyncSession, 
+        user_id: int, 
+        removed: Iterable[tuple[str, Decimal]] = (), 
+        added: Iterable[tuple[str, Decimal]] = (),
+        ):
+        # Called before the caller's commit, so the totals change in the same transaction as the rows.
+        income = expenses = Decimal(0)
+        for type, amount in added:
+            if type == 'income':
+                income += amount
+            else:
+                expenses += amount
+        for type, amount in removed:
+            if type == 'income':
+                income -= amount
+            else:
+                expenses -= amount
+        if income or expenses:
+            await session.execute(update(UserBalance).where(UserBalance.id_user == user_id).values(
+                income=UserBalance.income + income,
+                expenses=UserBalance.expenses + expenses,
+                ))
+        else:
+            await BalanceRepository.lock(session, user_id)
+
+    @staticmethod
+    async def lock(session: AsyncSession, user_id: int):
+        # The row lock every rollup change is made under; rebuild_rollups takes the same one.
+        await session.execute(select(UserBalance.id).where(UserBalance.id_user == user_id).with_for_update())
+
+    @staticmethod
+    async def get_balance(session: AsyncSession, user_id: int) -> Decimal:
+        query = select(UserBalance.income - UserBalance.expenses).where(UserBalance.id_user == user_id)
+        return await session.scalar(query) or Decimal(0)
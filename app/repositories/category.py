@@ -2,8 +2,10 @@ from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
 
 from app.core.database import Category
+from app.repositories.rollup import RollupRepository
 
 
 class CategoryRepository:
@@ -48,17 +50,40 @@ class CategoryRepository:
 
 
     @staticmethod
-    async def update_category(session: AsyncSession, category_id: int, name: str, type: str, description: str):
-        query = update(Category).where(Category.id == category_id).values(
-            name=name,  
-            type=type,  
-            description=description,
+    async def update_category(
+        session: AsyncSession, 
+        category_id: int, 
+        user_id: int, 
+        name: str, 
+        type: str, 
+        description: str,
+        ) -> Optional[int]:
+        # A duplicate name surfaces as IntegrityError from uq_categories_id_user_name.
+        query = (
+            update(Category)
+            .where(Category.id == category_id, Category.id_user == user_id)
+            .values(name=name, type=type, description=description)
+            .returning(Category.id)
             )
-        await session.execute(query)
+        try:
+            result = await session.execute(query)
+        except IntegrityError:
+            await session.rollback()
+            raise
+        updated_id = result.scalar()
         await session.commit()
+        return updated_id
 
 
     @staticmethod
-    async def delete_category(session: AsyncSession, id_category: int):
-        await session.execute(delete(Category).where(Category.id == id_category))
-        await session.commit()
\ No newline at end of file
+    async def delete_category(session: AsyncSession, id_category: int, user_id: int) -> Optional[int]:
+        await RollupRepository.fold_category(session, user_id, id_category)
+        query = (
+            delete(Category)
+            .where(Category.id == id_category, Category.id_user == user_id)
+            .returning(Category.id)
+            )
+        result = await session.execute(query)
+        deleted_id = result.scalar()
+        await session.commit()
+        return deleted_id
@@ -0,0 +1,68 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, delete, null
+
+from app.core.database import MonthlyRollup
+from app.repositories.balance import BalanceRepository
+
+
+ROLLUP_KEY = ['id_user', 'id_category', 'month', 'type']
+
+
+def month_of(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().replace(day=1)
+
+
+def accumulate(query):
+    return query.on_conflict_do_update(index_elements=ROLLUP_KEY, set_={
+        'total': MonthlyRollup.total + query.excluded.total,
+        'count': MonthlyRollup.count + query.excluded.count,
+        })
+
+
+class RollupRepository:
+
+    @staticmethod
+    async def apply_changes(
+        session: AsyncSession, 
+        user_id: int, 
+        removed: Iterable[tuple[Optional[int], datetime, str, Decimal]] = (), 
+        added: Iterable[tuple[Optional[int], datetime, str, Decimal]] = (),
+        ):
+        # Rows are (id_category, date, type, amount); each touched bucket gets one upserted delta.
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for sign, rows in ((-1, removed), (1, added)):
+            for id_category, value, type, amount in rows:
+                delta = deltas[(id_category, month_of(value), type)]
+                delta[0] += sign * amount
+                delta[1] += sign
+        values = [
+            {'id_user': user_id, 'id_category': id_category, 'month': month, 'type': type, 'total': total, 'count': count}
+            for (id_category, month, type), (total, count) in deltas.items() if total or count
+            ]
+        if values:
+            await session.execute(accumulate(insert(MonthlyRollup).values(values)))
+
+    @staticmethod
+    async def fold_category(session: AsyncSession, user_id: int, category_id: int):
+        # Transactions of a deleted category keep id_category = NULL, so their buckets move there too.
+        await BalanceRepository.lock(session, user_id)
+        moved = select(
+            MonthlyRollup.id_user, 
+            null().label('id_category'), 
+            MonthlyRollup.month, 
+            MonthlyRollup.type, 
+            MonthlyRollup.total, 
+            MonthlyRollup.count,
+            ).where(MonthlyRollup.id_user == user_id, MonthlyRollup.id_category == category_id)
+        await session.execute(accumulate(insert(MonthlyRollup).from_select([*ROLLUP_KEY, 'total', 'count'], moved)))
+        await session.execute(
+            delete(MonthlyRollup).where(MonthlyRollup.id_user == user_id, MonthlyRollup.id_category == category_id)
+            )
@@ -1,15 +1,36 @@
-from typing import Optional
+from datetime import datetime
+from typing import AsyncIterator, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, join
+from sqlalchemy.orm import aliased
+from sqlalchemy import select, insert, update, delete, join, outerjoin, tuple_
 from fastapi import HTTPException
 
 from app.core.database import Category, Transaction
+from app.repositories.balance import BalanceRepository
+from app.repositories.rollup import RollupRepository
+
+
+def ledger(table=Transaction) -> tuple:
+    # The columns every derived total (balance, monthly rollup) is computed from.
+    return table.id_category, table.date, table.type, table.amount
   
 
 class TransactionRepository:
 
 
+    @staticmethod
+    async def apply_changes(session: AsyncSession, user_id: int, removed: list = (), added: list = ()):
+        # Rows are ledger() tuples; called before the commit so derived totals move with the rows.
+        await BalanceRepository.apply_changes(
+            session, 
+            user_id, 
+            removed=[(type, amount) for _, _, type, amount in removed], 
+            added=[(type, amount) for _, _, type, amount in added],
+            )
+        await RollupRepository.apply_changes(session, user_id, removed=removed, added=added)
+
+
     @staticmethod
     async def check_category_existence(
         session: AsyncSession, 
@@ -20,6 +41,26 @@ class TransactionRepository:
         return await session.scalar(query)
     
 
+    @staticmethod
+    async def categories_by_name(session: AsyncSession, user_id: int, names: set[str]) -> dict[str, Category]:
+        query = select(Category).where(Category.id_user == user_id, Category.name.in_(names))
+        categories = await session.scalars(query)
+        return {category.name: category for category in categories}
+
+
+    @staticmethod
+    async def add_transactions(session: AsyncSession, user_id: int, rows: list[dict]):
+        # executemany: a single batched INSERT round trip, committed once.
+        if rows:
+            await session.execute(insert(Transaction), rows)
+            await TransactionRepository.apply_changes(
+                session, 
+                user_id, 
+                added=[(row['id_category'], row['date'], row['type'], row['amount']) for row in rows],
+                )
+        await session.commit()
+
+
     @staticmethod
     async def add_transaction(
         session: AsyncSession, 
@@ -35,8 +76,9 @@ class TransactionRepository:
             type=type,
             description=description,
             id_category=category_id,
-            ))
-        await session.execute(query)
+            ).returning(*ledger()))
+        row = (await session.execute(query)).one()
+        await TransactionRepository.apply_changes(session, id_user, added=[row])
         await session.commit()
 
 
@@ -59,6 +101,67 @@ class TransactionRepository:
         return result.mappings().all()
 
 
+    @staticmethod
+    async def transactions_page(
+        session: AsyncSession, 
+        user_id: int, 
+        limit: int,
+        cursor: Optional[tuple[datetime, int]] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        category: Optional[str] = None,
+        type: Optional[str] = None,
+        ) -> list:
+        # Keyset pagination over ix_transactions_id_user_date_id, newest first.
+        # One extra row is fetched so the caller knows whether a next page exists.
+        j = join(Transaction, Category, Transaction.id_category == Category.id)
+        query = select(
+            Transaction.id, 
+            Category.name, 
+            Transaction.type, 
+            Transaction.amount, 
+            Transaction.date,
+            Transaction.description,
+            ).select_from(j).where(Transaction.id_user == user_id)
+        if cursor is not None:
+            # The plain bound on date is implied by the row comparison but is what partition pruning can use.
+            query = query.where(Transaction.date <= cursor[0], tuple_(Transaction.date, Transaction.id) < tuple_(*cursor))
+        if date_from is not None:
+            query = query.where(Transaction.date >= date_from)
+        if date_to is not None:
+            query = query.where(Transaction.date < date_to)
+        if category is not None:
+            query = query.where(Category.name == category)
+        if type is not None:
+            query = query.where(Transaction.type == type)
+        query = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1)
+        result = await session.execute(query)
+        return result.mappings().all()
+
+
+    @staticmethod
+    async def stream_transactions(session: AsyncSession, user_id: int, batch_size: int = 1000) -> AsyncIterator[list]:
+        # Server-side cursor: rows arrive `batch_size` at a time instead of all at once.
+        j = outerjoin(Transaction, Category, Transaction.id_category == Category.id)
+        query = (
+            select(
+                Transaction.id, 
+                Category.name, 
+                Transaction.type, 
+                Transaction.amount, 
+                Transaction.date,
+                Transaction.description,
+                )
+            .select_from(j)
+            .where(Transaction.id_user == user_id)
+            .order_by(Transaction.date.desc(), Transaction.id.desc())
+            .execution_options(yield_per=batch_size)
+            )
+        result = await session.stream(query)
+        async for partition in result.mappings().partitions():
+            yield partition
+
+
     @staticmethod
     async def check_transaction_existence(session: AsyncSession, user_id: int, transaction_id: int) -> Optional[int]:
         qwery = select(Transaction.id).where(Transaction.id_user == user_id, Transaction.id == transaction_id)
@@ -68,25 +171,112 @@ class TransactionRepository:
     @staticmethod
     async def update_transaction(
         session: AsyncSession, 
+        user_id: int,
         id_transaction: int, 
-        category_id: int, 
+        category_name: str, 
         new_amount: int, 
         new_description: str, 
-        category_type: str
-        ):
-        query = update(Transaction).where(Transaction.id == id_transaction).values(
-            id_category=category_id, 
-            amount=new_amount,
-            description=new_description,
-            type=category_type,
+        ) -> Optional[int]:
+        # Ownership of both the transaction and the category is checked by the UPDATE itself.
+        # The self-join on `old` returns the pre-update row for the balance and rollup deltas.
+        old = aliased(Transaction)
+        query = (
+            update(Transaction)
+            .where(
+                Transaction.id == id_transaction, 
+                Transaction.id_user == user_id, 
+                Category.id_user == Transaction.id_user, 
+                Category.name == category_name,
+                old.id == Transaction.id,
+                old.date == Transaction.date,
+                )
+            .values(
+                id_category=Category.id, 
+                amount=new_amount,
+                description=new_description,
+                type=Category.type,
+                )
+            .returning(Transaction.id, *ledger(), *ledger(old))
+            )
+        result = await session.execute(query)
+        row = result.one_or_none()
+        if row is None:
+            await session.commit()
+            return None
+        await TransactionRepository.apply_changes(session, user_id, removed=[row[5:]], added=[row[1:5]])
+        await session.commit()
+        return row[0]
+
+
+    @staticmethod
+    def selector_conditions(
+        user_id: int,
+        ids: Optional[list[int]] = None,
+        category: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        ) -> list:
+        conditions = [Transaction.id_user == user_id]
+        if ids is not None:
+            conditions.append(Transaction.id.in_(ids))
+        if category is not None:
+            source = aliased(Category)
+            conditions.append(Transaction.id_category.in_(
+                select(source.id).where(source.id_user == user_id, source.name == category)
+                ))
+        if date_from is not None:
+            conditions.append(Transaction.date >= date_from)
+        if date_to is not None:
+            conditions.append(Transaction.date < date_to)
+        return conditions
+
+
+    @staticmethod
+    async def bulk_recategorize(session: AsyncSession, user_id: int, conditions: list, category_name: str) -> int:
+        old = aliased(Transaction)
+        query = (
+            update(Transaction)
+            .where(
+                *conditions, 
+                Category.id_user == Transaction.id_user, 
+                Category.name == category_name, 
+                old.id == Transaction.id,
+                old.date == Transaction.date,
+                )
+            .values(id_category=Category.id, type=Category.type)
+            .returning(*ledger(), *ledger(old))
             )
-        await session.execute(query)
+        rows = (await session.execute(query)).all()
+        await TransactionRepository.apply_changes(
+            session, 
+            user_id, 
+            removed=[row[4:] for row in rows], 
+            added=[row[:4] for row in rows],
+            )
+        await session.commit()
+        return len(rows)
+
+
+    @staticmethod
+    async def bulk_delete(session: AsyncSession, user_id: int, conditions: list) -> int:
+        query = delete(Transaction).where(*conditions).returning(*ledger())
+        rows = (await session.execute(query)).all()
+        await TransactionRepository.apply_changes(session, user_id, removed=rows)
         await session.commit()
+        return len(rows)
 
 
     @staticmethod
-    async def delete_transaction(session: AsyncSession, transaction_id: int):
-        await session.execute(delete(Transaction).where(Transaction.id == transaction_id))
+    async def delete_transaction(session: AsyncSession, user_id: int, transaction_id: int) -> Optional[int]:
+        query = (
+            delete(Transaction)
+            .where(Transaction.id == transaction_id, Transaction.id_user == user_id)
+            .returning(Transaction.id, *ledger())
+            )
+        row = (await session.execute(query)).one_or_none()
+        if row is not None:
+            await TransactionRepository.apply_changes(session, user_id, removed=[row[1:]])
         await session.commit()
+        return row[0] if row is not None else None
 
 
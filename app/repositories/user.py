@@ -1,8 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, update
 from typing import Optional
 
 from app.core.database import User
+from app.repositories.balance import BalanceRepository
 
 
 class UserRepository:
@@ -20,11 +21,19 @@ class UserRepository:
         return await session.scalar(select(User.email).where(User.email == email))
 
     @staticmethod
-    async def adding_user(session: AsyncSession, name: str, email: str, hashed_password):
-        query = insert(User).values(name=name, email=email, hashed_password=hashed_password)
-        await session.execute(query)
+    async def adding_user(session: AsyncSession, name: str, email: str, hashed_password) -> int:
+        query = insert(User).values(name=name, email=email, hashed_password=hashed_password).returning(User.id)
+        result = await session.execute(query)
+        user_id = result.scalar()
+        await BalanceRepository.create_balance(session, user_id)
         await session.commit()
+        return user_id
 
     @staticmethod
     async def get_user_by_email(session: AsyncSession, email: str) -> Optional[User]: 
-        return await session.scalar(select(User).where(User.email == email))
\ No newline at end of file
+        return await session.scalar(select(User).where(User.email == email))
+
+    @staticmethod
+    async def update_password_hash(session: AsyncSession, id: int, hashed_password: str):
+        await session.execute(update(User).where(User.id == id).values(hashed_password=hashed_password))
+        await session.commit()
@@ -0,0 +1,57 @@
+import json
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.schemas.user import AnalyticsRow, TransactionDepends
+from app.repositories.analytics import AnalyticsRepository
+from app.core.config import BaseAppException
+from app.core.redis import redis_analytics
+
+
+analytics_router = APIRouter(prefix='/analytics', tags=['Analytics'])
+
+
+async def cached_totals(
+    d: TransactionDepends, 
+    group_by: str, 
+    bucket: Optional[str], 
+    date_from: Optional[date], 
+    date_to: Optional[date],
+    ) -> list:
+    if date_from and date_to and date_from >= date_to:
+        raise BaseAppException(status_code=422, message='"from" must be earlier than "to"')
+
+    async def compute() -> list:
+        rows = await AnalyticsRepository.totals(d.session, d.user_id, group_by, bucket, date_from, date_to)
+        return [{
+            **row, 
+            'period': row['period'].isoformat() if row.get('period') else None, 
+            'total': float(row['total']), 
+            'count': int(row['count']),
+            } for row in rows]
+
+    key = json.dumps([group_by, bucket, str(date_from), str(date_to)])
+    return await redis_analytics(d.redis_app, d.user_id, key, compute)
+
+
+@analytics_router.get('/summary', summary='totals by category or type', response_model=list[AnalyticsRow])
+async def summary(
+    group_by: Literal['category', 'type'] = Query('category'),
+    date_from: Optional[date] = Query(None, alias='from'),
+    date_to: Optional[date] = Query(None, alias='to', description='exclusive'),
+    d: TransactionDepends = Depends(),
+    ):
+    return await cached_totals(d, group_by, None, date_from, date_to)
+
+
+@analytics_router.get('/timeseries', summary='totals per day, week or month', response_model=list[AnalyticsRow])
+async def timeseries(
+    bucket: Literal['day', 'week', 'month'] = Query('month'),
+    group_by: Literal['category', 'type'] = Query('type'),
+    date_from: Optional[date] = Query(None, alias='from'),
+    date_to: Optional[date] = Query(None, alias='to', description='exclusive'),
+    d: TransactionDepends = Depends(),
+    ):
+    return await cached_totals(d, group_by, bucket, date_from, date_to)
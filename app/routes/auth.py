@@ -1,47 +1,65 @@
 from datetime import datetime, timezone, timedelta
 
-import jwt
-from fastapi import APIRouter, Depends, status, Query
-from passlib.hash import pbkdf2_sha256   
+from fastapi import APIRouter, Depends, Request, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 
 from app.schemas.user import UserCreate, UserLogin, UserOut, UserOutId
-from app.core.security import token_verification, get_id_current_user
+from app.core.security import token_verification, get_id_current_user, get_read_session
 from app.repositories.user import UserRepository
-from app.core.config import auth, BaseAppException, redis_expire
+from app.core.config import auth, BaseAppException
+from app.core.tokens import token_service
+from app.core.hashing import password_hasher
+from app.core.rate_limit import login_limiter, registration_limiter
 from app.core.database import get_async_session, get_redis
+from app.core.redis import invalidate_user_cache, mark_recent_write, cache_expire
 
 
 user_router = APIRouter(tags=['Registration/Authorization'])
 
 
 @user_router.post('/registration', summary='Registration', response_model=dict)
-async def add_user(new_user: UserCreate, session: AsyncSession = Depends(get_async_session)):
+async def add_user(
+    new_user: UserCreate, 
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    redis_app: Redis = Depends(get_redis)
+    ):
+    await registration_limiter.check(redis_app, request, new_user.email)
     user = await UserRepository.сhecking_user_existence_by_email(session, new_user.email)
     if user:
         raise BaseAppException(
             status_code=status.HTTP_401_UNAUTHORIZED,  
             message='A user with this email is already registered'
             )
-    hashed_password = pbkdf2_sha256.hash(new_user.password)
-    await UserRepository.adding_user(session, new_user.name, new_user.email, hashed_password)
+    hashed_password = await password_hasher.hash(new_user.password)
+    user_id = await UserRepository.adding_user(session, new_user.name, new_user.email, hashed_password)
+    await invalidate_user_cache(redis_app, user_id)
+    await mark_recent_write(redis_app, user_id)
     return {'status': f'User with email {new_user.email} successfully added'}
 
 
 @user_router.post('/login', summary='Login', response_model=dict) 
-async def user_login(user: UserLogin, session: AsyncSession = Depends(get_async_session)):#respons: Response, 
+async def user_login(
+    user: UserLogin, 
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    redis_app: Redis = Depends(get_redis)
+    ):#respons: Response, 
+    await login_limiter.check(redis_app, request, user.email)
     user_db = await UserRepository.get_user_by_email(session, user.email)
     if not user_db:
         raise BaseAppException(status_code=status.HTTP_401_UNAUTHORIZED, message='Not surch user')
-    if user.email == user_db.email and pbkdf2_sha256.verify(user.password, user_db.hashed_password):
-        private_key = auth.private_key_path.read_text()  
+    if user.email == user_db.email and await password_hasher.verify(user.password, user_db.hashed_password):
+        if password_hasher.needs_rehash(user_db.hashed_password):
+            hashed_password = await password_hasher.hash(user.password)
+            await UserRepository.update_password_hash(session, user_db.id, hashed_password)
         expire = datetime.now(timezone.utc) + timedelta(minutes=auth.expiration)
         refresh_expire = datetime.now(timezone.utc) + timedelta(days=auth.expiration)
         payload = {"sub": str(user_db.id), "exp": expire, 'type': 'access'}
-        encode_jwt = jwt.encode(payload, private_key, algorithm=auth.algorithm)
+        encode_jwt = token_service.encode(payload)
         refresh_payload = {"sub": str(user_db.id), "exp": refresh_expire, 'type': 'refresh'}
-        refresh_token = jwt.encode(refresh_payload, private_key, algorithm=auth.algorithm)
+        refresh_token = token_service.encode(refresh_payload)
         #respons.set_cookie(key='eccess_token', value=encode_jwt, samesite='None', httponly=True, secure=False, domain='localhost')
         return {'eccess_token': encode_jwt, 'refresh_token': refresh_token}       
     raise BaseAppException(status_code=status.HTTP_401_UNAUTHORIZED, message='Invalid password')
@@ -51,7 +69,7 @@ async def user_login(user: UserLogin, session: AsyncSession = Depends(get_async_
 async def get_user_data(
     redis_app: Redis = Depends(get_redis),
     user_id: UserOutId = Depends(get_id_current_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_read_session)
     ):
     user_info_from_redis = await redis_app.hgetall(f'User information: {user_id}')
     if user_info_from_redis:
@@ -65,16 +83,15 @@ async def get_user_data(
             'email': user.email, 
             'date_registration': user.date_registration
             })
-        await redis_app.expire(f'User information: {user_id}', redis_expire)
+        await redis_app.expire(f'User information: {user_id}', cache_expire(session))
         return user
                      
 
 @user_router.get('/refresh-token', summary='Refresh token', response_model=dict)
 async def refresh_token(id_user: str = Depends(token_verification)):
-    private_key = auth.private_key_path.read_text()  
     expire = datetime.now(timezone.utc) + timedelta(minutes=auth.expiration)
     payload = {"sub": str(id_user), "exp": expire, 'type': 'access'}
-    encode_jwt = jwt.encode(payload, private_key, algorithm=auth.algorithm)
+    encode_jwt = token_service.encode(payload)
     return {'access token': encode_jwt}
 
 
@@ -2,8 +2,9 @@ from typing import Dict
 import json
 
 from fastapi import APIRouter, Depends, Body, status
+from sqlalchemy.exc import IntegrityError
 
-from app.schemas.user import CategoryCreate, UpdateCategory, CategoryOut, CategoryDepends
+from app.schemas.user import CategoryCreate, UpdateCategory, CategoryOut, CategoryDepends, CategoryReadDepends
 from app.repositories.category import CategoryRepository
 from app.core.config import BaseAppException
 from app.core.redis import redis_update_categories
@@ -29,7 +30,7 @@ async def add_category(category: CategoryCreate, d: CategoryDepends = Depends())
 
 
 @category_router.get('', summary='get all categories', response_model=list[CategoryOut])
-async def get_all_categories(d: CategoryDepends = Depends()):
+async def get_all_categories(d: CategoryReadDepends = Depends()):
     categories_from_redis = await d.redis_app.get(f'Categories user_id: {d.user_id}')
     if not categories_from_redis:
         categories_from_db = await redis_update_categories(d.session, d.redis_app, d.user_id)
@@ -40,26 +41,25 @@ async def get_all_categories(d: CategoryDepends = Depends()):
 @category_router.put('', summary='change category', response_model=dict)
 @update_redis_cache
 async def update_category(category: UpdateCategory, d: CategoryDepends = Depends()):
-    category_db = await CategoryRepository.get_category(d.session, category.id, d.user_id)
-    if not category_db:
-        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, massage='No such category')
-    list_existing_categories = await CategoryRepository.list_name_existing_categories(d.session, d.user_id)
-    if category.new_name != category_db.name and category.new_name in list_existing_categories:
+    try:
+        updated = await CategoryRepository.update_category(
+            d.session, 
+            category.id, 
+            d.user_id,
+            category.new_name, 
+            category.new_type_category, 
+            category.new_description,
+            )
+    except IntegrityError:
         raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='such a category already exists')
-    await CategoryRepository.update_category(
-        d.session, 
-        category.id, 
-        category.new_name, 
-        category.new_type_category, 
-        category.new_description,
-        )
+    if not updated:
+        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such category')
     return {"status": "Category changed"}
 
 
 @category_router.delete('', summary='delete category', response_model=dict)
 @update_redis_cache
 async def delete_category(category: Dict[str, int] = Body({'id': 0}), d: CategoryDepends = Depends()):
-    if not await CategoryRepository.get_category(d.session, category.get('id'), d.user_id):
+    if not await CategoryRepository.delete_category(d.session, category.get('id'), d.user_id):
         raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such category')
-    await CategoryRepository.delete_category(d.session, category.get('id'))
     return {"status": f'Category № {category.get('id')} deleted'}
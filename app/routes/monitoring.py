@@ -0,0 +1,36 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.core.metrics import registry
+from app.core.query_stats import slow_queries
+from app.core.config import BaseAppException, query_stats_settings
+
+
+monitoring_router = APIRouter(tags=['Monitoring'])
+
+
+@monitoring_router.get('/metrics', summary='Prometheus metrics', include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def require_debug_token(token: Optional[str] = Header(None, alias='X-Debug-Token')):
+    # Entries hold statements from every user's requests, so a user token is not enough.
+    expected = query_stats_settings.debug_token
+    if expected is None:
+        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='Not Found')
+    if token is None or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise BaseAppException(status_code=status.HTTP_403_FORBIDDEN, message='Invalid debug token')
+
+
+@monitoring_router.get(
+        '/debug/slow-queries', 
+        summary='Recent slow SQL statements', 
+        response_model=list[dict], 
+        dependencies=[Depends(require_debug_token)],
+        )
+async def get_slow_queries():
+    return list(reversed(slow_queries))
@@ -1,14 +1,56 @@
-from fastapi import Depends, Form, Query, status
+import base64
+import binascii
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Literal, Optional, Union
 
-from app.schemas.user import TransactionCreate, TransactionUpdate, TransacrionsOut, TransactionDepends
+from fastapi import Depends, Form, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.schemas.user import (
+    TransactionCreate, 
+    TransactionImport, 
+    BulkImportResult, 
+    TransactionSelector, 
+    BulkRecategorize, 
+    BulkResult, 
+    TransactionUpdate, 
+    TransacrionsOut, 
+    TransactionsPage, 
+    TransactionDepends, 
+    TransactionReadDepends, 
+    TypeCategory,
+    )
 from app.repositories.transaction import TransactionRepository
 from app.core.config import BaseAppException
+from app.core.security import get_read_sessionmaker
 from app.core.decorators import TasksRouter
 
 
 transaction_router = TasksRouter(prefix='/transactions', tags=['Транзакции'])
 
 
+def encode_cursor(date: datetime, id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([date.isoformat(), id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        date, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise BaseAppException(status_code=422, message='Invalid cursor')
+
+
+def format_transaction(tran) -> dict:
+    tran = dict(tran)
+    tran['date'] = tran.get('date').strftime('%Y-%m-%d %H:%M:%S')
+    return tran
+
+
 @transaction_router.post('', response_model=dict)
 async def add_new_transaction(transaction: TransactionCreate, d: TransactionDepends = Depends()):
     category = await TransactionRepository.check_category_existence(d.session, d.user_id, transaction.category)
@@ -25,48 +67,219 @@ async def add_new_transaction(transaction: TransactionCreate, d: TransactionDepe
     return {'status': 'Transaction added'}
 
 
+BULK_MAX_ROWS = 10000
+
+BULK_MAX_BYTES = 2 * 1024 * 1024
+
+
+async def read_bulk_rows(request: Request) -> list:
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            raise BaseAppException(status_code=422, message='Attach the CSV as "file"')
+        data = await upload.read(BULK_MAX_BYTES + 1)
+        if len(data) > BULK_MAX_BYTES:
+            raise BaseAppException(status_code=413, message=f'At most {BULK_MAX_BYTES} bytes per upload')
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BaseAppException(status_code=422, message='The CSV file must be UTF-8 encoded')
+        return list(csv.DictReader(io.StringIO(text)))
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > BULK_MAX_BYTES:
+            raise BaseAppException(status_code=413, message=f'At most {BULK_MAX_BYTES} bytes per request')
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise BaseAppException(status_code=422, message='Expected a JSON array or a CSV upload')
+    if not isinstance(rows, list):
+        raise BaseAppException(status_code=422, message='Expected a JSON array or a CSV upload')
+    return rows
+
+
+@transaction_router.post('/bulk', summary='import many transactions at once', response_model=BulkImportResult)
+async def bulk_add_transactions(request: Request, d: TransactionDepends = Depends()):
+    rows = await read_bulk_rows(request)
+    if len(rows) > BULK_MAX_ROWS:
+        raise BaseAppException(status_code=413, message=f'At most {BULK_MAX_ROWS} rows per request')
+    errors = []
+    parsed = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'error': 'Row must be an object'})
+            continue
+        try:
+            parsed.append((number, TransactionImport.model_validate({k: v for k, v in row.items() if v != ''})))
+        except ValidationError as exc:
+            message = '; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+            errors.append({'row': number, 'error': message})
+    categories = {}
+    if parsed:
+        categories = await TransactionRepository.categories_by_name(
+            d.session, 
+            d.user_id, 
+            {transaction.category for _, transaction in parsed},
+            )
+    now = datetime.now(timezone.utc)
+    values = []
+    for number, transaction in parsed:
+        category = categories.get(transaction.category)
+        if category is None:
+            errors.append({'row': number, 'error': 'No such category'})
+            continue
+        values.append({
+            'id_user': d.user_id,
+            'amount': transaction.amount,
+            'type': category.type,
+            'description': transaction.description,
+            'id_category': category.id,
+            'date': transaction.date or now,
+            })
+    await TransactionRepository.add_transactions(d.session, d.user_id, values)
+    return {'inserted': len(values), 'errors': sorted(errors, key=lambda error: error['row'])}
+
+
+def bulk_conditions(selector: TransactionSelector, user_id: int) -> list:
+    if selector.ids is None and selector.category is None and selector.date_from is None and selector.date_to is None:
+        raise BaseAppException(status_code=422, message='Specify ids or a filter (category, date_from, date_to)')
+    return TransactionRepository.selector_conditions(
+        user_id, 
+        selector.ids, 
+        selector.category, 
+        selector.date_from, 
+        selector.date_to,
+        )
+
+
+@transaction_router.put('/bulk', summary='recategorise many transactions', response_model=BulkResult)
+async def bulk_update_transactions(selector: BulkRecategorize, d: TransactionDepends = Depends()):
+    conditions = bulk_conditions(selector, d.user_id)
+    count = await TransactionRepository.bulk_recategorize(d.session, d.user_id, conditions, selector.new_category)
+    if not count and not await TransactionRepository.check_category_existence(
+        d.session, 
+        d.user_id, 
+        selector.new_category,
+        ):
+        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such category')
+    return {'count': count}
+
+
+@transaction_router.delete('/bulk', summary='delete many transactions', response_model=BulkResult)
+async def bulk_delete_transactions(selector: TransactionSelector, d: TransactionDepends = Depends()):
+    count = await TransactionRepository.bulk_delete(d.session, d.user_id, bulk_conditions(selector, d.user_id))
+    return {'count': count}
+
+
 @transaction_router.get(
         path='', 
-        summary='all|one|income|expenses transactions', 
-        response_model=list[TransacrionsOut], 
+        summary='all|one|income|expenses transactions or a page of them', 
+        response_model=Union[list[TransacrionsOut], TransactionsPage], 
         decorate=False
         ) 
 async def get_transactions(
-    data: str = Query(..., description='Enter "all" | "income" | "expenses" | id_transaction'),
-    d: TransactionDepends = Depends()
+    data: Optional[str] = Query(
+        None, 
+        description='Enter "all" | "income" | "expenses" | id_transaction, or leave empty for pagination',
+        ),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description='next_cursor from the previous page'),
+    date_from: Optional[datetime] = Query(None, alias='from'),
+    date_to: Optional[datetime] = Query(None, alias='to'),
+    category: Optional[str] = Query(None),
+    type: Optional[TypeCategory] = Query(None),
+    d: TransactionReadDepends = Depends()
     ): 
+    if data is None:
+        rows = await TransactionRepository.transactions_page(
+            d.session,
+            d.user_id,
+            limit,
+            decode_cursor(cursor) if cursor else None,
+            date_from,
+            date_to,
+            category,
+            type,
+            )
+        next_cursor = encode_cursor(rows[limit - 1]['date'], rows[limit - 1]['id']) if len(rows) > limit else None
+        return {'items': [format_transaction(tran) for tran in rows[:limit]], 'next_cursor': next_cursor}
     if data not in ["all", "income", "expenses"] and not data.isdigit():
         raise BaseAppException(status_code=422, message='Data entered incorrectly!!!!!')
     transactions = await TransactionRepository.all_incom_expenses_one(d.session, d.user_id, data)
     if transactions == []:
         raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such transactions')
-    list_result = []
-    for tran in transactions: 
-        tran = dict(tran)    
-        tran['date'] = tran.get('date').strftime('%Y-%m-%d %H:%M:%S')
-        list_result.append(tran)
-    return list_result 
+    return [format_transaction(tran) for tran in transactions]
+
+
+EXPORT_FIELDS = ['id', 'name', 'type', 'amount', 'date', 'description']
+
+
+async def export_rows(
+    sessionmaker: Callable, 
+    user_id: int, 
+    format: Literal['ndjson', 'csv'],
+    ) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+    async with sessionmaker() as session:
+        async for rows in TransactionRepository.stream_transactions(session, user_id):
+            for row in rows:
+                if format == 'csv':
+                    writer.writerow([
+                        row['id'], row['name'], row['type'], row['amount'], row['date'].isoformat(), row['description'],
+                        ])
+                else:
+                    buffer.write(json.dumps({
+                        'id': row['id'],
+                        'name': row['name'],
+                        'type': row['type'],
+                        'amount': float(row['amount']),
+                        'date': row['date'].isoformat(),
+                        'description': row['description'],
+                        }, ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@transaction_router.get('/export', summary='download the full history', decorate=False)
+async def export_transactions(
+    format: Literal['ndjson', 'csv'] = Query('ndjson'),
+    d: TransactionDepends = Depends(),
+    sessionmaker: Callable = Depends(get_read_sessionmaker),
+    ):
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        export_rows(sessionmaker, d.user_id, format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="transactions.{format}"'},
+        )
 
 
 @transaction_router.put('', response_model=dict)
 async def update_transaction(transaction: TransactionUpdate, d: TransactionDepends = Depends()):
-    if not await TransactionRepository.check_transaction_existence(
-        d.session, 
-        d.user_id, 
-        transaction.id_transaction,
-        ):
-        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='You do not have such a transaction')
-    category = await TransactionRepository.check_category_existence(d.session, d.user_id, transaction.category)
-    if not category:
-        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such category')
-    await TransactionRepository.update_transaction(
+    updated = await TransactionRepository.update_transaction(
         d.session,
+        d.user_id,
         transaction.id_transaction, 
-        category.id, 
+        transaction.category, 
         transaction.amount, 
         transaction.description, 
-        category.type,
         )
+    if not updated:
+        if not await TransactionRepository.check_transaction_existence(
+            d.session, 
+            d.user_id, 
+            transaction.id_transaction,
+            ):
+            raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='You do not have such a transaction')
+        raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such category')
     return {'status': 'Transaction changed'}
 
 
@@ -75,8 +288,7 @@ async def delete_transaction(
     transaction: int = Form(..., description='Enter the transaction number you want to delete'),
     d: TransactionDepends = Depends()
     ):   
-    if not await TransactionRepository.check_transaction_existence(d.session, d.user_id, transaction):
+    if not await TransactionRepository.delete_transaction(d.session, d.user_id, transaction):
         raise BaseAppException(status_code=status.HTTP_404_NOT_FOUND, message='No such transactions')
-    await TransactionRepository.delete_transaction(d.session, transaction)
     return {'status': f'Transaction № {transaction} deleted'}
 
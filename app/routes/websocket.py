@@ -13,8 +13,10 @@ import asyncio
 from pydantic import ValidationError
 from redis.asyncio import Redis
 
-from app.core.config import auth
-from app.core.database import get_async_session, Transaction, User, get_redis
+from app.core.tokens import token_service
+from app.core.database import get_async_session, User, get_redis, read_session
+from app.core.redis import read_from_primary
+from app.repositories.balance import BalanceRepository
 from app.schemas.user import WsChat
 
 
@@ -24,22 +26,20 @@ ws_router = APIRouter(tags=['Websocket'])
 @ws_router.websocket('/conversion')
 async def ws(
     websocket: WebSocket, 
-    session_db: AsyncSession = Depends(get_async_session),
+    redis_app: Redis = Depends(get_redis),
     token: str = Query(...)
     ):
     await websocket.accept()
     try:
-        payload = jwt.decode(token, auth.public_key_path.read_text(), algorithms=auth.algorithm)
+        payload = token_service.decode(token)
         if payload.get('type') != 'access':
             return await websocket.close(reason='Not аccess token')
         user_id = int(payload.get('sub'))
     except (jwt.PyJWTError, jwt.InvalidTokenError, jwt.DecodeError, jwt.InvalidSignatureError): 
         return await websocket.close(reason='Token error')
     while True:
-        q = select(Transaction.amount, Transaction.type).where(Transaction.id_user == user_id)
-        query = await session_db.execute(q)
-        list_amount = query.mappings().all()
-        balance = sum(i.get('amount') if i.get('type') == 'income' else -(i.get('amount')) for i in list_amount)
+        async with read_session(await read_from_primary(redis_app, user_id)) as session_db:
+            balance = await BalanceRepository.get_balance(session_db, user_id)
         async with aiohttp.ClientSession() as session:
                 url = f'https://v6.exchangerate-api.com/v6/ed74cdc023db94d33a67cc05/latest/RUB'
                 async with session.get(url) as response:
@@ -66,7 +66,7 @@ async def ws_chat(
     ):
     await websocket.accept()
     try:
-        payload = jwt.decode(token, auth.public_key_path.read_text(), algorithms=auth.algorithm)
+        payload = token_service.decode(token)
         if payload.get('type') != 'access':
             await websocket.send_json({'Error': 'Not eccess token'})
             await websocket.close(reason='Not eccess token') 
@@ -1,6 +1,7 @@
 from enum import StrEnum
+from datetime import date, datetime
 from decimal import Decimal
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,7 +9,7 @@ from fastapi import Depends
 from redis.asyncio import Redis
 
 from app.core.database import get_async_session, get_redis
-from app.core.security import get_id_current_user
+from app.core.security import get_id_current_user, get_read_session
 
 
 class UserLogin(BaseModel):
@@ -62,12 +63,54 @@ class TransacrionsOut(BaseModel):
     description: str
 
 
+class TransactionsPage(BaseModel):
+    items: list[TransacrionsOut]
+    next_cursor: Optional[str] = None
+
+
 class TransactionCreate(BaseModel):
     category: str 
     amount: Decimal = Field(0, decimal_places=2, gt=Decimal('0.00'), le=Decimal('100000000.00'))
     description: str
 
 
+class TransactionImport(TransactionCreate):
+    date: Optional[datetime] = None
+
+
+class BulkImportError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    errors: list[BulkImportError]
+
+
+class TransactionSelector(BaseModel):
+    ids: Optional[list[int]] = Field(None, max_length=10000)
+    category: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+
+class BulkRecategorize(TransactionSelector):
+    new_category: str
+
+
+class BulkResult(BaseModel):
+    count: int
+
+
+class AnalyticsRow(BaseModel):
+    period: Optional[date] = None
+    category: Optional[str] = None
+    type: str
+    total: float
+    count: int
+
+
 class TransactionUpdate(TransactionCreate):
     id_transaction: int
 
@@ -88,10 +131,36 @@ class TransactionDepends:
     def __init__(
             self, 
             session: AsyncSession = Depends(get_async_session), 
-            user_id: UserOutId = Depends(get_id_current_user)
+            user_id: UserOutId = Depends(get_id_current_user),
+            redis_app: Redis = Depends(get_redis)
+            ):
+        self.session = session
+        self.user_id = user_id
+        self.redis_app = redis_app
+
+
+class CategoryReadDepends:
+    def __init__(
+            self, 
+            session: AsyncSession = Depends(get_read_session),
+            user_id: UserOutId = Depends(get_id_current_user),
+            redis_app: Redis = Depends(get_redis)  
             ):
         self.session = session
         self.user_id = user_id
+        self.redis_app = redis_app
+
+
+class TransactionReadDepends:
+    def __init__(
+            self, 
+            session: AsyncSession = Depends(get_read_session), 
+            user_id: UserOutId = Depends(get_id_current_user),
+            redis_app: Redis = Depends(get_redis)
+            ):
+        self.session = session
+        self.user_id = user_id
+        self.redis_app = redis_app
 
 
 class WsChat(BaseModel):
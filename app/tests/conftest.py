@@ -4,6 +4,7 @@ import sys
 from pathlib import Path
 
 import pytest
+from sqlalchemy import insert
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 import pytest_asyncio
@@ -72,6 +73,23 @@ async def session_db(engine):
         yield session
     
 
+@pytest_asyncio.fixture
+async def sqlite_sessionmaker():
+    # In-memory schema holding only user 1; tests add the rest of their rows themselves.
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User).values(id=1, name='u', email='u@mail.ru', hashed_password='x', date_registration=datetime(2023, 1, 1)))
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def sqlite_session(sqlite_sessionmaker):
+    async with sqlite_sessionmaker() as session:
+        yield session
+
+
 @pytest_asyncio.fixture
 async def mock_redis():
     redis = AsyncMock()
@@ -79,6 +97,7 @@ async def mock_redis():
     redis.get.return_value = ''
     redis.hset.return_value = True
     redis.expire.return_value = True
+    redis.eval.return_value = 0
     yield redis
 
 
@@ -0,0 +1,78 @@
+import json
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql
+
+from app.core.database import Category, MonthlyRollup
+from app.repositories.analytics import AnalyticsRepository
+from app.schemas.user import TransactionDepends
+from main import app
+
+
+async def get(path, session, redis_app):
+    app.dependency_overrides[TransactionDepends] = lambda: SimpleNamespace(session=session, user_id=1, redis_app=redis_app)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            return await client.get(path)
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_summary_and_monthly_series_come_from_rollup(sqlite_session):
+    session = sqlite_session
+    await session.execute(insert(Category), [
+        {'id': 1, 'name': 'Food', 'type': 'expenses', 'description': '', 'id_user': 1},
+        {'id': 2, 'name': 'Salary', 'type': 'income', 'description': '', 'id_user': 1},
+        ])
+    await session.execute(insert(MonthlyRollup), [
+        {'id_user': 1, 'id_category': 1, 'month': date(2023, 1, 1), 'type': 'expenses', 'total': Decimal('30.00'), 'count': 3},
+        {'id_user': 1, 'id_category': 1, 'month': date(2023, 2, 1), 'type': 'expenses', 'total': Decimal('12.50'), 'count': 1},
+        {'id_user': 1, 'id_category': 2, 'month': date(2023, 2, 1), 'type': 'income', 'total': Decimal('100.00'), 'count': 1},
+        {'id_user': 1, 'id_category': None, 'month': date(2023, 3, 1), 'type': 'expenses', 'total': Decimal('0'), 'count': 0},
+        ])
+    await session.commit()
+    redis_app = AsyncMock()
+    redis_app.get.return_value = None
+    summary = await get('/analytics/summary?from=2023-01-01&to=2024-01-01', session, redis_app)
+    assert summary.json() == [
+        {'period': None, 'category': 'Food', 'type': 'expenses', 'total': 42.5, 'count': 4},
+        {'period': None, 'category': 'Salary', 'type': 'income', 'total': 100.0, 'count': 1},
+        ]
+    series = await get('/analytics/timeseries?bucket=month&group_by=type', session, redis_app)
+    assert series.json() == [
+        {'period': '2023-01-01', 'category': None, 'type': 'expenses', 'total': 30.0, 'count': 3},
+        {'period': '2023-02-01', 'category': None, 'type': 'expenses', 'total': 12.5, 'count': 1},
+        {'period': '2023-02-01', 'category': None, 'type': 'income', 'total': 100.0, 'count': 1},
+        ]
+    key, _, value = redis_app.setex.call_args_list[0][0]
+    assert key.startswith('Analytics user_id: 1: v0: ')
+    assert json.loads(value)[0]['total'] == 42.5
+
+
+@pytest.mark.asyncio
+async def test_cached_result_is_served_for_current_version():
+    redis_app = AsyncMock()
+    cached = [{'period': None, 'category': None, 'type': 'income', 'total': 5.0, 'count': 1}]
+    redis_app.get.side_effect = lambda key: '7' if key == 'Analytics version user_id: 1' else json.dumps(cached)
+    response = await get('/analytics/summary?group_by=type', None, redis_app)
+    assert response.json() == cached
+    assert redis_app.get.call_args[0][0].startswith('Analytics user_id: 1: v7: ')
+    redis_app.setex.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_week_buckets_and_partial_months_scan_transactions():
+    mock_session = AsyncMock()
+    mock_session.execute.return_value = MagicMock()
+    await AnalyticsRepository.totals(mock_session, 1, 'type', 'month', date(2023, 1, 15), None)
+    await AnalyticsRepository.totals(mock_session, 1, 'category', 'week')
+    partial, weekly = [str(call[0][0].compile(dialect=postgresql.dialect())) for call in mock_session.execute.call_args_list]
+    assert 'FROM transactions' in partial and "date_trunc('month'" in partial
+    assert "GROUP BY CAST(date_trunc('week', timezone('UTC', transactions.date)) AS DATE), categories.name" in weekly
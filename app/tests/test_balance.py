@@ -0,0 +1,66 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from app.core import tasks
+from app.core.database import Base, User, Transaction, UserBalance
+from app.repositories.balance import BalanceRepository
+
+
+@pytest.mark.asyncio
+async def test_apply_changes_moves_running_totals(sqlite_session):
+    session = sqlite_session
+    await BalanceRepository.create_balance(session, 1)
+    await BalanceRepository.apply_changes(session, 1, added=[('income', Decimal('100.00')), ('expenses', Decimal('30.00'))])
+    await BalanceRepository.apply_changes(
+        session, 1, removed=[('expenses', Decimal('30.00'))], added=[('income', Decimal('30.00'))],
+        )
+    await session.commit()
+    assert await BalanceRepository.get_balance(session, 1) == Decimal('130.00')
+    assert await BalanceRepository.get_balance(session, 2) == Decimal(0)
+
+
+def test_reconcile_balances_repairs_drift(monkeypatch, tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "db.sqlite"}')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': i, 'name': 'u', 'email': f'u{i}@mail.ru', 'hashed_password': 'x', 'date_registration': datetime(2023, 1, 1)}
+            for i in (1, 2, 3)
+            ])
+        conn.execute(insert(Transaction), [
+            {'id_user': 1, 'amount': Decimal('10.00'), 'type': 'income', 'date': datetime(2023, 1, 1), 'description': ''},
+            {'id_user': 1, 'amount': Decimal('4.00'), 'type': 'expenses', 'date': datetime(2023, 1, 2), 'description': ''},
+            {'id_user': 2, 'amount': Decimal('7.00'), 'type': 'income', 'date': datetime(2023, 1, 3), 'description': ''},
+            ])
+        conn.execute(insert(UserBalance), [
+            {'id_user': 1, 'income': Decimal('10.00'), 'expenses': Decimal('4.00')},
+            {'id_user': 2, 'income': Decimal('1.00'), 'expenses': Decimal('0')},
+            ])
+    monkeypatch.setattr(tasks, 'SyncSession', sessionmaker(bind=engine))
+    assert tasks.reconcile_balances() == {'checked': 2, 'drifted': [2, 3]}
+    with engine.connect() as conn:
+        balances = conn.execute(select(UserBalance.id_user, UserBalance.income, UserBalance.expenses).order_by(UserBalance.id_user)).all()
+    assert balances == [(1, Decimal('10.00'), Decimal('4.00')), (2, Decimal('7.00'), Decimal('0')), (3, Decimal('0'), Decimal('0'))]
+    engine.dispose()
+
+
+def test_reconcile_locks_only_the_users_balance_row():
+    sql = str(tasks.lock_balance(1).compile(dialect=postgresql.dialect()))
+    assert sql.endswith('WHERE user_balances.id_user = %(id_user_1)s FOR UPDATE')
+    assert 'transactions' not in sql
+
+
+@pytest.mark.asyncio
+async def test_zero_delta_still_takes_the_balance_row_lock():
+    session = AsyncMock()
+    await BalanceRepository.apply_changes(
+        session, 1, removed=[('expenses', Decimal('5.00'))], added=[('expenses', Decimal('5.00'))],
+        )
+    sql = str(session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+    assert sql.endswith('FOR UPDATE')
@@ -4,7 +4,7 @@ import pytest
 from sqlalchemy import and_
 from sqlalchemy.sql import Select, Insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from passlib.hash import pbkdf2_sha256 
 from sqlalchemy import select, insert
 
@@ -207,14 +207,16 @@ async def test_get_category_errors(exception, user_id, category_id):
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
-    "category_id, name, type, description, should_raise, scenario",
+    "category_id, name, type, description, returned_id, should_raise, scenario",
     [
-        (1, "New Name", "expense", "New description", False, "valid_update"),
-        (2, "Other", "income", "", False, "empty_description"),
-        (1, "", "expense", "Desc", False, "empty_name"),
-        (1, "Name", "expense", None, False, "null_description"),
-        (1, "Name", "expense", "Desc", True, "db_error"),
-        (None, "Name", "expense", "Desc", True, "null_category_id"),
+        (1, "New Name", "expense", "New description", 1, False, "valid_update"),
+        (2, "Other", "income", "", 2, False, "empty_description"),
+        (1, "", "expense", "Desc", 1, False, "empty_name"),
+        (1, "Name", "expense", None, 1, False, "null_description"),
+        (3, "Name", "expense", "Desc", None, False, "foreign_category"),
+        (1, "Name", "expense", "Desc", None, True, "db_error"),
+        (1, "Taken", "expense", "Desc", None, True, "duplicate_name"),
+        (None, "Name", "expense", "Desc", None, True, "null_category_id"),
     ],
 )
 async def test_update_category(
@@ -222,6 +224,7 @@ async def test_update_category(
     name: str,
     type: str,
     description: str,
+    returned_id: int,
     should_raise: bool,
     scenario: str
 ):
@@ -229,29 +232,31 @@ async def test_update_category(
     if should_raise:
         if category_id is None:
             mock_session.execute.side_effect = ValueError("Invalid category_id")
+        elif scenario == "duplicate_name":
+            mock_session.execute.side_effect = IntegrityError("UPDATE", {}, Exception("uq_categories_id_user_name"))
         else:
             mock_session.execute.side_effect = SQLAlchemyError("DB error")
             mock_session.commit.side_effect = SQLAlchemyError("Commit failed")
     else:
         mock_result = MagicMock()
-        mock_result.rowcount = 1
+        mock_result.scalar.return_value = returned_id
         mock_session.execute.return_value = mock_result
     if should_raise:
         with pytest.raises((SQLAlchemyError, ValueError)):
             await CategoryRepository.update_category(
-                mock_session, category_id, name, type, description
+                mock_session, category_id, 1, name, type, description
             )
+        assert mock_session.rollback.called == (scenario == "duplicate_name")
     else:
-        await CategoryRepository.update_category(
-            mock_session, category_id, name, type, description
+        result = await CategoryRepository.update_category(
+            mock_session, category_id, 1, name, type, description
         )
-    if not should_raise:
-        assert mock_session.execute.called
+        assert result == returned_id
         called_query = mock_session.execute.call_args[0][0]
         assert str(called_query.table) == "categories"
-        assert str(called_query.whereclause.left) == "categories.id"
-        assert called_query.whereclause.right.value == category_id
+        assert called_query.whereclause.compare((Category.id == category_id) & (Category.id_user == 1))
         compiled = called_query.compile()
+        assert "RETURNING categories.id" in str(compiled)
         assert compiled.params["name"] == name
         assert compiled.params["type"] == type
         if description is not None:
@@ -261,52 +266,42 @@ async def test_update_category(
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
-    "category_id, mock_rowcount, should_raise, scenario",
+    "category_id, returned_id, should_raise, scenario",
     [
         (1, 1, False, "successful_delete"),
-        (2, 1, False, "another_successful_delete"),
-        (999, 0, False, "non_existent_category"),
-        (1, 0, True, "db_execute_error"),
+        (2, 2, False, "another_successful_delete"),
+        (999, None, False, "non_existent_category"),
+        (1, None, True, "db_execute_error"),
         (1, 1, True, "db_commit_error"),
-        (None, 0, True, "null_category_id"),
+        (None, None, True, "null_category_id"),
     ],
 )
 async def test_delete_category(
     category_id: int,
-    mock_rowcount: int,
+    returned_id: int,
     should_raise: bool,
     scenario: str
 ):
     mock_session = AsyncMock()
-    if should_raise:
-        if scenario == "db_execute_error":
-            mock_session.execute.side_effect = SQLAlchemyError("Execute failed")
-        elif scenario == "db_commit_error":
-            mock_result = MagicMock()
-            mock_result.rowcount = mock_rowcount
-            mock_session.execute.return_value = mock_result
-            mock_session.commit.side_effect = SQLAlchemyError("Commit failed")
-        else:  
-            mock_session.execute.side_effect = ValueError("Invalid category_id")
-    else:
-        mock_result = MagicMock()
-        mock_result.rowcount = mock_rowcount
-        mock_session.execute.return_value = mock_result
+    mock_result = MagicMock()
+    mock_result.scalar.return_value = returned_id
+    mock_session.execute.return_value = mock_result
+    if scenario == "db_execute_error":
+        mock_session.execute.side_effect = SQLAlchemyError("Execute failed")
+    elif scenario == "db_commit_error":
+        mock_session.commit.side_effect = SQLAlchemyError("Commit failed")
+    elif scenario == "null_category_id":
+        mock_session.execute.side_effect = ValueError("Invalid category_id")
     if should_raise:
         with pytest.raises((SQLAlchemyError, ValueError)):
-            await CategoryRepository.delete_category(mock_session, category_id)
-    else:
-        await CategoryRepository.delete_category(mock_session, category_id)
-    if not should_raise:
+            await CategoryRepository.delete_category(mock_session, category_id, 1)
         assert mock_session.execute.called
+    else:
+        assert await CategoryRepository.delete_category(mock_session, category_id, 1) == returned_id
         called_query = mock_session.execute.call_args[0][0]   
         assert str(called_query.table) == "categories"
-        assert str(called_query.whereclause.left) == "categories.id"
-        assert called_query.whereclause.right.value == category_id
+        assert called_query.whereclause.compare((Category.id == category_id) & (Category.id_user == 1))
         assert mock_session.commit.called
-    else:
-        if scenario == "db_commit_error":
-            assert mock_session.execute.called
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+from passlib.hash import pbkdf2_sha256
+
+from app.core.config import PasswordHashing, BaseAppException
+from app.core.hashing import PasswordHasher, calibrate_rounds
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify():
+    hasher = PasswordHasher(PasswordHashing(workers=1, max_queue=1))
+    hashed = await hasher.hash('strongpassword')
+    assert await hasher.verify('strongpassword', hashed)
+    assert not await hasher.verify('wrongpassword', hashed)
+    assert hasher.stats['hash'].count == 1
+    assert hasher.stats['verify'].count == 2
+    assert hasher.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_returns_503():
+    hasher = PasswordHasher(PasswordHashing(workers=1, max_queue=1))
+    results = await asyncio.gather(
+        *(hasher._run('hash', time.sleep, 0.1) for _ in range(3)),
+        return_exceptions=True,
+        )
+    rejected = [r for r in results if isinstance(r, BaseAppException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 503
+    assert hasher.stats['hash'].rejected == 1
+    assert hasher.stats['hash'].count == 2
+    assert hasher.stats['hash'].wait_seconds > 0.05
+
+
+def test_calibrate_rounds_scales_with_target():
+    fast = calibrate_rounds(5, sample_rounds=2000, samples=1)
+    slow = calibrate_rounds(50, sample_rounds=2000, samples=1)
+    assert fast >= 1000
+    assert fast % 1000 == 0
+    assert slow > fast
+
+
+@pytest.mark.asyncio
+async def test_needs_rehash_on_outdated_rounds():
+    hasher = PasswordHasher(PasswordHashing(workers=1, max_queue=1, rounds=2000))
+    hashed = await hasher.hash('strongpassword')
+    assert not hasher.needs_rehash(hashed)
+    assert hasher.needs_rehash(pbkdf2_sha256.using(rounds=1000).hash('strongpassword'))
+    assert not hasher.needs_rehash(pbkdf2_sha256.using(rounds=3000).hash('strongpassword'))
+    assert not hasher.needs_rehash('not-a-hash')
+    assert await hasher.verify('strongpassword', pbkdf2_sha256.using(rounds=1000).hash('strongpassword'))
+
+
+@pytest.mark.asyncio
+async def test_rounds_from_environment(monkeypatch):
+    monkeypatch.setenv('PASSWORD_HASH_ROUNDS', '2000')
+    monkeypatch.setenv('PASSWORD_HASH_TARGET_MS', '5')
+    settings = PasswordHashing(workers=1, max_queue=1)
+    assert settings.rounds == 2000
+    assert settings.target_ms == 5.0
+    hasher = PasswordHasher(settings)
+    hashed = pbkdf2_sha256.using(rounds=2000).hash('strongpassword')
+    assert not hasher.needs_rehash(hashed)
+    assert await hasher.verify('strongpassword', hashed)
+    monkeypatch.delenv('PASSWORD_HASH_ROUNDS')
+    assert PasswordHasher(PasswordHashing(workers=1, max_queue=1)).rounds % 1000 == 0
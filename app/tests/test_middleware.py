@@ -0,0 +1,144 @@
+import json
+import logging
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import JsonFormatter, log_settings, body_log_settings
+from app.core.database import TimedQueuePool
+from app.core.metrics import registry, instrument_pool
+from app.core.middleware import LoggingMiddleware, MetricsMiddleware, mask_sensitive
+from main import app
+
+
+test_app = FastAPI()
+test_app.add_middleware(LoggingMiddleware)
+
+
+@test_app.get('/stream')
+async def stream():
+    async def chunks():
+        for i in range(3):
+            yield f'chunk-{i};'.encode()
+    return StreamingResponse(chunks(), media_type='text/plain')
+
+
+@test_app.post('/echo')
+async def echo(request: Request):
+    return await request.json()
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_passes_through(caplog):
+    caplog.set_level(logging.INFO)
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url='http://test') as ac:
+        response = await ac.get('/stream')
+    assert response.text == 'chunk-0;chunk-1;chunk-2;'
+    assert 'Запрос: GET http://test/stream' in caplog.text
+    assert 'Ответ: 200 - 24 bytes - chunk-0;chunk-1;chunk-2;...' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_request_body_is_logged_and_still_readable(caplog):
+    caplog.set_level(logging.INFO)
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url='http://test') as ac:
+        response = await ac.post('/echo', json={'amount': 10})
+    assert response.json() == {'amount': 10}
+    assert 'Запрос: POST http://test/echo {"amount":10}' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_request_body_is_capped_and_masked(caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr(body_log_settings, 'max_bytes', 40)
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url='http://test') as ac:
+        response = await ac.post('/echo', json={'password': 'secret123', 'description': 'x' * 100})
+    assert response.json()['password'] == 'secret123'
+    assert 'secret123' not in caplog.text
+    assert '{"password":"***","description":"x...[truncated]' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_request_body_capture_disabled_per_route(caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr(body_log_settings, 'routes', {'/echo': 0})
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url='http://test') as ac:
+        await ac.post('/echo', json={'amount': 10})
+    assert 'Запрос: POST http://test/echo\n' in caplog.text + '\n'
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"password": "a\\"b", "name": "x"}', '{"password": "***", "name": "x"}'),
+        ('email=a%40b.ru&password=123', 'email=a%40b.ru&password=***'),
+        ('{"refresh_token": "abc', '{"refresh_token": "***"'),
+    ],
+)
+def test_mask_sensitive(text, expected):
+    assert mask_sensitive(text) == expected
+
+
+@pytest.mark.asyncio
+async def test_successful_get_is_sampled(caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr(log_settings, 'success_get_sample_rate', 0.0)
+    async with AsyncClient(transport=ASGITransport(app=test_app), base_url='http://test') as ac:
+        await ac.get('/stream')
+        await ac.get('/missing')
+    assert 'Запрос: GET http://test/stream' not in caplog.text
+    assert 'Запрос: GET http://test/missing' in caplog.text
+    assert 'Ответ: 404' in caplog.text
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.makeLogRecord({'msg': 'Ответ: %s', 'args': (200,), 'levelname': 'INFO', 'status': 200})
+    data = json.loads(JsonFormatter().format(record))
+    assert data['message'] == 'Ответ: 200'
+    assert data['status'] == 200
+    assert data['level'] == 'INFO'
+
+
+@pytest.mark.asyncio
+async def test_metrics_use_route_template():
+    metrics_app = FastAPI()
+    metrics_app.add_middleware(MetricsMiddleware)
+
+    @metrics_app.get('/items/{item_id}')
+    async def item(item_id: int):
+        return item_id
+
+    labels = {'method': 'GET', 'route': '/items/{item_id}', 'status': '200'}
+    before = registry.get_sample_value('http_requests_total', labels) or 0
+    async with AsyncClient(transport=ASGITransport(app=metrics_app), base_url='http://test') as ac:
+        await ac.get('/items/1')
+        await ac.get('/items/2')
+        await ac.get('/nowhere')
+    assert registry.get_sample_value('http_requests_total', labels) == before + 2
+    assert registry.get_sample_value('http_requests_total', {**labels, 'route': 'unmatched', 'status': '404'}) >= 1
+    assert registry.get_sample_value('http_requests_in_flight') == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as ac:
+        await ac.get('/health')
+        response = await ac.get('/metrics')
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/health"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_pool_checkout_is_timed():
+    pool_engine = create_async_engine('sqlite+aiosqlite://', poolclass=TimedQueuePool, pool_size=1, max_overflow=0)
+    instrument_pool(pool_engine.pool)
+    before = registry.get_sample_value('db_pool_checkout_wait_seconds_count') or 0
+    async with pool_engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+        assert registry.get_sample_value('db_pool_saturation') == 1
+    assert registry.get_sample_value('db_pool_checkout_wait_seconds_count') == before + 1
+    await pool_engine.dispose()
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core import tasks
+from app.core.database import Base, User, Transaction, UserBalance, MonthlyRollup
+
+
+def test_month_helpers():
+    assert tasks.add_months(date(2023, 11, 1), 3) == date(2024, 2, 1)
+    assert tasks.add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert tasks.partition_name(date(2024, 2, 1)) == 'transactions_2024_02'
+    assert tasks.partition_month('transactions_2024_02') == date(2024, 2, 1)
+    assert tasks.partition_month('transactions_default') is None
+
+
+def test_maintain_partitions_creates_missing_and_detaches_old(monkeypatch):
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    existing = [tasks.partition_name(tasks.add_months(current, offset)) for offset in (-13, -12, -11, 0, 1)]
+    statements = []
+    session = MagicMock()
+    session.__enter__.return_value = session
+    session.execute.side_effect = lambda query: statements.append(str(query)) or MagicMock(
+        scalars=MagicMock(return_value=existing + ['transactions_default'])
+        )
+    monkeypatch.setattr(tasks, 'SyncSession', lambda: session)
+    result = tasks.maintain_transaction_partitions(months_ahead=2, retention_months=12)
+    new = tasks.partition_name(tasks.add_months(current, 2))
+    assert result == {'created': [new], 'detached': existing[:1]}
+    assert statements[1] == f'CREATE TABLE {new} (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    assert statements[2].startswith('WITH moved AS (DELETE FROM transactions_default WHERE date >= ')
+    assert statements[3].startswith(f'ALTER TABLE transactions ATTACH PARTITION {new} FOR VALUES FROM (')
+    assert statements[4] == f'LOCK TABLE {existing[0]} IN SHARE MODE'
+    assert statements[5].startswith('DELETE FROM monthly_rollups WHERE monthly_rollups.month = ')
+    assert statements[6].startswith('INSERT INTO monthly_rollups (id_user, id_category, type, month, total, count) SELECT')
+    assert statements[7].startswith('INSERT INTO archived_months (month)')
+    assert statements[8] == f'ALTER TABLE transactions DETACH PARTITION {existing[0]}'
+    session.commit.assert_called_once()
+
+
+def test_maintain_partitions_keeps_history_by_default(monkeypatch):
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    existing = [tasks.partition_name(tasks.add_months(current, offset)) for offset in (-40, 0, 1, 2, 3)]
+    session = MagicMock()
+    session.__enter__.return_value = session
+    session.execute.return_value.scalars.return_value = existing
+    monkeypatch.setattr(tasks, 'SyncSession', lambda: session)
+    assert tasks.maintain_transaction_partitions(months_ahead=3, retention_months=0) == {'created': [], 'detached': []}
+
+
+def test_reconcile_after_detach_keeps_balances(monkeypatch, tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "db.sqlite"}')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'id': 1, 'name': 'u', 'email': 'u1@mail.ru', 'hashed_password': 'x', 'date_registration': datetime(2023, 1, 1)},
+            ])
+        conn.execute(insert(Transaction), [
+            {'id_user': 1, 'amount': Decimal('10.00'), 'type': 'income', 'date': datetime(2023, 1, 5), 'description': ''},
+            {'id_user': 1, 'amount': Decimal('4.00'), 'type': 'expenses', 'date': datetime(2023, 1, 9), 'description': ''},
+            {'id_user': 1, 'amount': Decimal('3.00'), 'type': 'expenses', 'date': datetime(2023, 2, 2), 'description': ''},
+            ])
+        conn.execute(insert(UserBalance).values(id_user=1, income=Decimal('10.00'), expenses=Decimal('7.00')))
+    SyncSession = sessionmaker(bind=engine)
+    monkeypatch.setattr(tasks, 'SyncSession', SyncSession)
+    with SyncSession() as session:
+        tasks.archive_month(session, date(2023, 1, 1))
+        # What DETACH PARTITION does to the parent table.
+        session.execute(delete(Transaction).where(Transaction.date < datetime(2023, 2, 1)))
+        session.commit()
+    assert tasks.reconcile_balances() == {'checked': 1, 'drifted': []}
+    with engine.connect() as conn:
+        assert conn.execute(select(UserBalance.income, UserBalance.expenses)).one() == (Decimal('10.00'), Decimal('7.00'))
+        assert conn.execute(select(MonthlyRollup.month, MonthlyRollup.type, MonthlyRollup.total, MonthlyRollup.count)
+                            .order_by(MonthlyRollup.type)).all() == [
+            (date(2023, 1, 1), 'expenses', Decimal('4.00'), 1), (date(2023, 1, 1), 'income', Decimal('10.00'), 1),
+            ]
+    engine.dispose()
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import query_stats
+from app.core.config import query_stats_settings
+from app.core.middleware import LoggingMiddleware
+from main import app
+
+
+@pytest.mark.parametrize(
+    "parameters, expected",
+    [
+        ({'id_1': 5, 'name_1': 'Food'}, {'id_1': 'int', 'name_1': 'str'}),
+        ([{'a': 1}, {'a': 2}], "2 x {'a': 'int'}"),
+        ((1, 'x'), ['int', 'str']),
+    ],
+)
+def test_parameters_shape(parameters, expected):
+    assert query_stats.parameters_shape(parameters) == expected
+
+
+@pytest.mark.asyncio
+async def test_queries_are_counted_per_request_and_slow_ones_kept(caplog, monkeypatch):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr(query_stats_settings, 'slow_query_ms', 0)
+    query_stats.slow_queries.clear()
+    engine = create_async_engine('sqlite+aiosqlite://')
+    query_stats.instrument_engine(engine.sync_engine)
+    counted_app = FastAPI()
+    counted_app.add_middleware(LoggingMiddleware)
+
+    @counted_app.get('/items/{item_id}')
+    async def item(item_id: int):
+        async with engine.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+            return (await conn.execute(text('SELECT :id'), {'id': item_id})).scalar()
+
+    async with AsyncClient(transport=ASGITransport(app=counted_app), base_url='http://test') as ac:
+        await ac.get('/items/7')
+    await engine.dispose()
+    record = next(r for r in caplog.records if r.getMessage().startswith('Ответ'))
+    assert record.db_queries == 2
+    assert query_stats.slow_queries[-1]['route'] == '/items/{item_id}'
+    assert query_stats.slow_queries[-1]['parameters'] == ['int']
+    assert query_stats.slow_queries[-1]['statement'] == 'SELECT ?'
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_need_the_debug_token(monkeypatch):
+    query_stats.slow_queries.clear()
+    query_stats.slow_queries.append({'route': '/items/{item_id}', 'statement': 'SELECT ?', 'parameters': ['int']})
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as ac:
+        monkeypatch.setattr(query_stats_settings, 'debug_token', None)
+        disabled = await ac.get('/debug/slow-queries', headers={'X-Debug-Token': 'secret'})
+        monkeypatch.setattr(query_stats_settings, 'debug_token', 'secret')
+        wrong = await ac.get('/debug/slow-queries', headers={'X-Debug-Token': 'guess'})
+        allowed = await ac.get('/debug/slow-queries', headers={'X-Debug-Token': 'secret'})
+    assert disabled.status_code == 404
+    assert wrong.status_code == 403
+    assert allowed.json() == [{'route': '/items/{item_id}', 'statement': 'SELECT ?', 'parameters': ['int']}]
@@ -0,0 +1,42 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from starlette.requests import Request
+
+from app.core.config import BaseAppException
+from app.core.rate_limit import SlidingWindowLimiter
+
+
+def make_request(host='10.0.0.1'):
+    return Request({'type': 'http', 'headers': [], 'client': (host, 5000)})
+
+
+@pytest.mark.asyncio
+async def test_limiter_allows_and_records_both_keys():
+    redis_app = AsyncMock()
+    redis_app.eval.return_value = 0
+    limiter = SlidingWindowLimiter('login', per_ip=10, per_email=3, window=60)
+    await limiter.check(redis_app, make_request(), 'User@Example.com')
+    args = redis_app.eval.call_args[0]
+    assert args[1] == 2
+    assert args[2:4] == ('Rate limit login ip: 10.0.0.1', 'Rate limit login email: user@example.com')
+    assert args[5] == 60000
+    assert args[-2:] == (10, 3)
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_with_429():
+    redis_app = AsyncMock()
+    redis_app.eval.return_value = 2
+    limiter = SlidingWindowLimiter('login', per_ip=10, per_email=3, window=60)
+    with pytest.raises(BaseAppException) as exc_info:
+        await limiter.check(redis_app, make_request(), 'user@example.com')
+    assert exc_info.value.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_disabled_limiter_skips_redis():
+    redis_app = AsyncMock()
+    limiter = SlidingWindowLimiter('registration', per_ip=0, per_email=0, window=60)
+    await limiter.check(redis_app, make_request(), 'user@example.com')
+    redis_app.eval.assert_not_called()
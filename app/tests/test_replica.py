@@ -0,0 +1,99 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.core import database, security
+from app.core import redis as redis_cache
+from app.core.config import redis_expire
+from app.core.database import ReadReplica
+
+
+def make_sessionmaker(url):
+    return async_sessionmaker(create_async_engine(url), expire_on_commit=False)
+
+
+@pytest.mark.asyncio
+async def test_replica_session_when_healthy():
+    replica = ReadReplica(make_sessionmaker('sqlite+aiosqlite://'), retry_interval=30)
+    session = await replica.session()
+    assert (await session.execute(text('SELECT 1'))).scalar() == 1
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_replica_falls_back_and_retries(tmp_path):
+    replica = ReadReplica(make_sessionmaker(f'sqlite+aiosqlite:///{tmp_path}/missing/db.sqlite'), retry_interval=30)
+    assert await replica.session() is None
+    assert replica.down_until > 0
+    replica.sessionmaker = make_sessionmaker('sqlite+aiosqlite://')
+    assert await replica.session() is None
+    replica.down_until = 0
+    session = await replica.session()
+    assert session is not None
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_replica_pool_timeout_falls_back():
+    session = AsyncMock()
+    session.connection.side_effect = PoolTimeoutError('QueuePool limit reached')
+    replica = ReadReplica(MagicMock(return_value=session), retry_interval=30)
+    assert await replica.session() is None
+    assert replica.down_until > 0
+    session.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_read_session_uses_primary_inside_write_window(monkeypatch):
+    primary = make_sessionmaker('sqlite+aiosqlite://')
+    replica = ReadReplica(make_sessionmaker('sqlite+aiosqlite://'), retry_interval=30)
+    replica.session = AsyncMock(return_value=None)
+    monkeypatch.setattr(database, 'SessionLocal', primary)
+    monkeypatch.setattr(database, 'read_replica', replica)
+    async with database.read_session(primary=True) as session:
+        assert session.bind is primary.kw['bind']
+    replica.session.assert_not_awaited()
+    async with database.read_session() as session:
+        assert session.bind is primary.kw['bind']
+    replica.session.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_read_session_prefers_replica(monkeypatch):
+    replica = ReadReplica(make_sessionmaker('sqlite+aiosqlite://'), retry_interval=30)
+    monkeypatch.setattr(security, 'read_replica', replica)
+    primary_session = object()
+    dependency = security.get_read_session(primary=False, session=primary_session)
+    session = await anext(dependency)
+    assert session is not primary_session
+    await dependency.aclose()
+    dependency = security.get_read_session(primary=True, session=primary_session)
+    assert await anext(dependency) is primary_session
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes_window(monkeypatch):
+    redis_app = AsyncMock()
+    await redis_cache.mark_recent_write(redis_app, 3)
+    redis_app.setex.assert_not_awaited()
+    assert await redis_cache.read_from_primary(redis_app, 3) is True
+    monkeypatch.setattr(redis_cache, 'read_replica', object())
+    await redis_cache.mark_recent_write(redis_app, 3)
+    redis_app.setex.assert_awaited_once_with('Recent write user_id: 3', 5, '1')
+    redis_app.exists.return_value = 0
+    assert await redis_cache.read_from_primary(redis_app, 3) is False
+    redis_app.exists.return_value = 1
+    assert await redis_cache.read_from_primary(redis_app, 3) is True
+
+
+@pytest.mark.asyncio
+async def test_replica_filled_cache_expires_with_write_window(monkeypatch):
+    replica = ReadReplica(make_sessionmaker('sqlite+aiosqlite://'), retry_interval=30)
+    monkeypatch.setattr(redis_cache, 'read_replica', replica)
+    async with replica.sessionmaker() as session:
+        assert redis_cache.cache_expire(session) == 5
+    async with make_sessionmaker('sqlite+aiosqlite://')() as session:
+        assert redis_cache.cache_expire(session) == redis_expire
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timezone, timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+
+from app.core import tasks
+from app.core.database import Category, MonthlyRollup
+from app.repositories.rollup import RollupRepository, month_of
+
+
+def test_month_is_taken_in_utc():
+    moscow = timezone(timedelta(hours=3))
+    assert month_of(datetime(2023, 2, 1, 1, 0, tzinfo=moscow)) == date(2023, 1, 1)
+    assert month_of(datetime(2023, 2, 1, 1, 0)) == date(2023, 2, 1)
+
+
+async def rollups(session):
+    query = select(MonthlyRollup.id_category, MonthlyRollup.month, MonthlyRollup.total, MonthlyRollup.count)
+    return (await session.execute(query.order_by(MonthlyRollup.month))).all()
+
+
+@pytest.mark.asyncio
+async def test_deltas_accumulate_per_bucket_and_fold_on_category_delete(sqlite_session):
+    session = sqlite_session
+    await session.execute(insert(Category).values(id=1, name='Food', type='expenses', description='', id_user=1))
+    await RollupRepository.apply_changes(session, 1, added=[
+        (1, datetime(2023, 1, 5), 'expenses', Decimal('10.00')),
+        (1, datetime(2023, 1, 20), 'expenses', Decimal('5.00')),
+        (1, datetime(2023, 2, 1), 'expenses', Decimal('7.00')),
+        ])
+    await RollupRepository.apply_changes(
+        session, 1, 
+        removed=[(1, datetime(2023, 1, 20), 'expenses', Decimal('5.00'))], 
+        added=[(1, datetime(2023, 1, 20), 'expenses', Decimal('8.00'))],
+        )
+    assert await rollups(session) == [(1, date(2023, 1, 1), Decimal('18.00'), 2), (1, date(2023, 2, 1), Decimal('7.00'), 1)]
+    await RollupRepository.fold_category(session, 1, 1)
+    assert await rollups(session) == [(None, date(2023, 1, 1), Decimal('18.00'), 2), (None, date(2023, 2, 1), Decimal('7.00'), 1)]
+
+
+def test_rebuild_locks_the_users_balance_row_and_recomputes_one_user(monkeypatch):
+    statements = []
+    session = MagicMock()
+    session.__enter__.return_value = session
+    archived = date(2023, 1, 1)
+    session.execute.side_effect = lambda query: statements.append(str(query.compile(dialect=postgresql.dialect()))) or MagicMock(
+        rowcount=3, scalar=MagicMock(return_value=archived),
+        )
+    monkeypatch.setattr(tasks, 'SyncSession', lambda: session)
+    assert tasks.rebuild_rollups(5) == 3
+    assert statements[0].endswith('WHERE user_balances.id_user = %(id_user_1)s FOR UPDATE')
+    assert statements[1].startswith('SELECT max(archived_months.month)')
+    assert statements[2] == (
+        'DELETE FROM monthly_rollups WHERE monthly_rollups.id_user = %(id_user_1)s AND monthly_rollups.month >= %(month_1)s'
+        )
+    assert statements[3].startswith('INSERT INTO monthly_rollups (id_user, id_category, month, type, total, count) SELECT')
+    assert 'WHERE transactions.id_user = %(id_user_1)s AND transactions.date >= %(date_1)s GROUP BY' in statements[3]
+    assert not any(statement.startswith('LOCK TABLE') for statement in statements)
+    session.commit.assert_called_once()
@@ -0,0 +1,138 @@
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+import pytest
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives import serialization
+from starlette.requests import Request
+
+from app.core import security
+from app.core.cache import LRUCache
+from app.core.config import AuthJWT
+from app.core.tokens import TokenService, rotate_jwks
+
+
+def write_key_pair(folder):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_path = folder / 'private_key.pem'
+    public_path = folder / 'public_key.pem'
+    private_path.write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+        ))
+    public_path.write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_path, public_path
+
+
+@pytest.fixture
+def service(tmp_path):
+    private_path, public_path = write_key_pair(tmp_path)
+    return TokenService(AuthJWT(private_key_path=private_path, public_key_path=public_path, key_check_interval=0))
+
+
+def make_payload(minutes):
+    return {'sub': '1', 'type': 'access', 'exp': datetime.now(timezone.utc) + timedelta(minutes=minutes)}
+
+
+def test_lru_cache_evicts_oldest_and_expired():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    cache.set('d', 4, expires_at=time.time() - 1)
+    assert cache.get('d') is None
+
+
+def test_decode_caches_verified_token(service, monkeypatch):
+    token = service.encode(make_payload(10))
+    assert service.decode(token)['sub'] == '1'
+    calls = []
+    monkeypatch.setattr(jwt, 'decode', lambda *args, **kwargs: calls.append(args))
+    assert service.decode(token)['type'] == 'access'
+    assert calls == []
+
+
+def test_decode_expired_token(service):
+    token = service.encode(make_payload(-10))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        service.decode(token)
+    assert service.decode(token, verify_exp=False)['sub'] == '1'
+
+
+def test_decode_invalid_signature(service, tmp_path):
+    other = tmp_path / 'other'
+    other.mkdir()
+    private_path, _ = write_key_pair(other)
+    foreign = jwt.encode(make_payload(10), private_path.read_text(), algorithm='RS256')
+    with pytest.raises(jwt.InvalidSignatureError):
+        service.decode(foreign)
+
+
+def test_key_reload_clears_cache(service, tmp_path):
+    token = service.encode(make_payload(10))
+    service.decode(token)
+    write_key_pair(tmp_path)
+    stat = service.settings.public_key_path.stat()
+    os.utime(service.settings.public_key_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    with pytest.raises(jwt.InvalidSignatureError):
+        service.decode(token)
+    assert service.decode(service.encode(make_payload(10)))['sub'] == '1'
+
+
+def test_request_token_claims_decodes_once(service, monkeypatch):
+    monkeypatch.setattr(security, 'token_service', service)
+    token = service.encode(make_payload(-10))
+    request = Request({'type': 'http', 'headers': []})
+    calls = []
+    decode = service.decode
+    monkeypatch.setattr(service, 'decode', lambda *args, **kwargs: calls.append(args) or decode(*args, **kwargs))
+    assert security.request_token_claims(request, token)['sub'] == '1'
+    assert security.request_token_claims(Request(request.scope), token)['sub'] == '1'
+    assert len(calls) == 1
+    with pytest.raises(jwt.DecodeError):
+        security.request_token_claims(request, 'broken')
+
+
+@pytest.mark.parametrize("algorithm", ['EdDSA', 'ES256', 'HS256', 'RS256'])
+def test_jwks_rotation_keeps_previous_key(tmp_path, algorithm):
+    jwks_path = tmp_path / 'jwks.json'
+    rotate_jwks(jwks_path, algorithm, 'first')
+    service = TokenService(AuthJWT(key_backend='jwks', jwks_path=jwks_path, key_check_interval=0))
+    old_token = service.encode(make_payload(10))
+    assert jwt.get_unverified_header(old_token) == {'alg': algorithm, 'kid': 'first', 'typ': 'JWT'}
+    rotate_jwks(jwks_path, 'EdDSA', 'second')
+    stat = jwks_path.stat()
+    os.utime(jwks_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    new_token = service.encode(make_payload(10))
+    assert jwt.get_unverified_header(new_token)['kid'] == 'second'
+    assert service.decode(old_token)['sub'] == '1'
+    assert service.decode(new_token)['sub'] == '1'
+    rotate_jwks(jwks_path, 'EdDSA', 'third')
+    os.utime(jwks_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000))
+    with pytest.raises(jwt.InvalidTokenError):
+        service.decode(old_token)
+
+
+def test_jwks_file_is_owner_only(tmp_path):
+    jwks_path = tmp_path / 'jwks.json'
+    jwks_path.write_text('{"keys": []}')
+    jwks_path.chmod(0o644)
+    rotate_jwks(jwks_path, 'EdDSA', 'first')
+    assert jwks_path.stat().st_mode & 0o777 == 0o600
+    assert not (tmp_path / 'jwks.json.tmp').exists()
+
+
+def test_secret_backend():
+    service = TokenService(AuthJWT(key_backend='secret', algorithm='HS256', secret_key='secret', key_id='k1'))
+    token = service.encode(make_payload(10))
+    assert jwt.decode(token, 'secret', algorithms=['HS256'])['sub'] == '1'
+    assert service.decode(token)['type'] == 'access'
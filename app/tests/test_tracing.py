@@ -0,0 +1,100 @@
+import json
+import threading
+from http.server import HTTPServer
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import tracing
+from app.core.config import TracingSettings
+from app.core.tracing import (
+    CollectorHandler, 
+    JsonlExporter, 
+    OtlpHttpExporter, 
+    SpanProcessor, 
+    Tracer, 
+    TracingMiddleware, 
+    instrument_engine, 
+    span,
+    )
+
+
+class ListExporter:
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = ListExporter()
+    tracer = Tracer(TracingSettings())
+    tracer.processor = SpanProcessor(exporter, interval=60)
+    monkeypatch.setattr(tracing, 'tracer', tracer)
+    yield exporter
+    tracer.processor.shutdown()
+
+
+def test_span_is_noop_outside_trace(exporter):
+    with span('orphan') as orphan:
+        assert orphan is None
+    tracing.tracer.processor.flush()
+    assert exporter.spans == []
+
+
+def test_nested_spans_share_trace(exporter):
+    with span('root', trace_id='a' * 32) as root:
+        with span('child') as child:
+            pass
+    tracing.tracer.processor.flush()
+    assert [s.name for s in exporter.spans] == ['child', 'root']
+    assert child.trace_id == root.trace_id == 'a' * 32
+    assert child.parent_id == root.span_id
+
+
+@pytest.mark.asyncio
+async def test_engine_and_middleware_spans(exporter):
+    engine = create_async_engine('sqlite+aiosqlite://')
+    instrument_engine(engine.sync_engine)
+    traced_app = FastAPI()
+    traced_app.add_middleware(TracingMiddleware)
+
+    @traced_app.get('/items/{item_id}')
+    async def item(item_id: int):
+        async with engine.connect() as conn:
+            return (await conn.execute(text('SELECT :id'), {'id': item_id})).scalar()
+
+    async with AsyncClient(transport=ASGITransport(app=traced_app), base_url='http://test') as ac:
+        response = await ac.get('/items/5', headers={'X-Trace-Id': 'b' * 32})
+    await engine.dispose()
+    tracing.tracer.processor.flush()
+    assert response.headers['x-trace-id'] == 'b' * 32
+    db_span, root = exporter.spans
+    assert db_span.name == 'db SELECT'
+    assert db_span.parent_id == root.span_id
+    assert root.name == 'HTTP GET /items/{item_id}'
+    assert root.attributes['http.status_code'] == 200
+
+
+def test_jsonl_and_otlp_exporters(tmp_path):
+    finished = tracing.Span('db SELECT', 'c' * 32, attributes={'db.rowcount': 1})
+    finished.end = finished.start + 1_000_000
+    JsonlExporter(tmp_path / 'spans.jsonl').export([finished])
+    assert json.loads((tmp_path / 'spans.jsonl').read_text())['duration_ms'] == 1.0
+
+    CollectorHandler.output = tmp_path / 'collected.jsonl'
+    server = HTTPServer(('127.0.0.1', 0), CollectorHandler)
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+    OtlpHttpExporter(f'http://127.0.0.1:{server.server_port}', 'test').export([finished])
+    thread.join()
+    server.server_close()
+    collected = json.loads(CollectorHandler.output.read_text())
+    assert collected['traceId'] == 'c' * 32
+    assert collected['attributes'] == [{'key': 'db.rowcount', 'value': {'intValue': '1'}}]
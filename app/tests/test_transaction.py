@@ -1,15 +1,27 @@
+import csv
+import io
+import json
 import sys
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 from decimal import Decimal
-from datetime import datetime
+from types import SimpleNamespace
+from datetime import date, datetime
 
 import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects import postgresql
 
-from app.core.database import Category, Transaction
+from app.core.database import Category, Transaction, User, UserBalance, MonthlyRollup
+from app.core.config import BaseAppException
+from app.repositories.balance import BalanceRepository
 from app.repositories.transaction import TransactionRepository
+from app.routes.transactions import encode_cursor, decode_cursor, export_rows
+from app.schemas.user import TransactionDepends
+from main import app
 
 
 @pytest.mark.asyncio
@@ -118,7 +130,7 @@ async def test_check_category_existence_with_exception():
 )
 async def test_add_transaction(id_user, amount, type, description, category_id, expected_values):
     mock_session = AsyncMock()
-    mock_session.execute.return_value = None
+    mock_session.execute.return_value = MagicMock(**{'one.return_value': (category_id, datetime(2023, 1, 15), type, amount)})
     await TransactionRepository.add_transaction(
         session=mock_session,
         id_user=id_user,
@@ -127,8 +139,8 @@ async def test_add_transaction(id_user, amount, type, description, category_id,
         description=description,
         category_id=category_id
     )
-    assert mock_session.execute.call_count == 1
-    called_query = mock_session.execute.call_args[0][0]
+    assert mock_session.execute.call_count == 3
+    called_query = mock_session.execute.call_args_list[0][0][0]
     assert str(called_query.table) == str(Transaction.__table__)
     compiled = called_query.compile()
     assert compiled.params["id_user"] == expected_values["id_user"]
@@ -136,6 +148,12 @@ async def test_add_transaction(id_user, amount, type, description, category_id,
     assert compiled.params["type"] == expected_values["type"]
     assert compiled.params["description"] == expected_values["description"]
     assert compiled.params["id_category"] == expected_values["id_category"]
+    balance_query = mock_session.execute.call_args_list[1][0][0]
+    assert str(balance_query.table) == "user_balances"
+    rollup_query = mock_session.execute.call_args_list[2][0][0].compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT (id_user, id_category, month, type) DO UPDATE" in str(rollup_query)
+    assert rollup_query.params["month_m0"] == date(2023, 1, 1)
+    assert rollup_query.params["count_m0"] == 1
     mock_session.commit.assert_awaited_once()
 
 
@@ -194,6 +212,32 @@ async def test_all_incom_expenses_one(user_id, input_data, expected_query, expec
             assert str(called_query) == str(expected_query)
 
 
+@pytest.mark.asyncio
+async def test_transactions_page_query():
+    mock_session = AsyncMock()
+    mock_session.execute.return_value.mappings = MagicMock()
+    cursor = (datetime(2023, 1, 5, 12, 30, 0, 123456), 42)
+    await TransactionRepository.transactions_page(
+        mock_session, 1, 20, cursor, datetime(2023, 1, 1), datetime(2023, 2, 1), 'Food', 'expenses',
+        )
+    called_query = mock_session.execute.call_args[0][0]
+    compiled = called_query.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert 'transactions.date <= %(date_1)s AND (transactions.date, transactions.id) < (%(param_1)s, %(param_2)s)' in sql
+    assert 'ORDER BY transactions.date DESC, transactions.id DESC' in sql
+    assert compiled.params['param_1'] == compiled.params['date_1'] == cursor[0]
+    assert compiled.params['param_2'] == 42
+    assert compiled.params['param_3'] == 21
+    assert compiled.params['name_1'] == 'Food'
+
+
+def test_cursor_round_trip():
+    date = datetime(2023, 1, 5, 12, 30, 0, 123456)
+    assert decode_cursor(encode_cursor(date, 42)) == (date, 42)
+    with pytest.raises(BaseAppException):
+        decode_cursor('not-a-cursor')
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "user_id,transaction_id,expected_result,mock_return",
@@ -221,86 +265,76 @@ async def test_check_transaction_existence(user_id, transaction_id, expected_res
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
-    "id_transaction, category_id, new_amount, new_description, category_type, expected_exception, exc_message",
+    "id_transaction, category_name, new_amount, new_description, returned_id, expected_exception, exc_message",
     [
-        (1, 5, Decimal("100.50"), "Food expenses", "expense", None, None),
-        (2, 3, Decimal("2000.00"), "Salary income", "income", None, None),
-        (3, None, Decimal("50.25"), "Miscellaneous", "expense", None, None),
-        (4, 5, Decimal("100.50"), "Food expenses", "expense", SQLAlchemyError, "Database error"),
-        (5, 3, "not_a_number", "Salary income", "income", TypeError, None),
+        (1, "Food", Decimal("100.50"), "Food expenses", 1, None, None),
+        (2, "Salary", Decimal("2000.00"), "Salary income", 2, None, None),
+        (3, "Other", Decimal("50.25"), "Miscellaneous", None, None, None),
+        (4, "Food", Decimal("100.50"), "Food expenses", None, SQLAlchemyError, "Database error"),
+        (5, "Salary", "not_a_number", "Salary income", None, TypeError, None),
     ],
 )
 async def test_update_transaction(
     id_transaction, 
-    category_id, 
+    category_name, 
     new_amount, 
     new_description, 
-    category_type,
+    returned_id,
     expected_exception,
     exc_message
 ):
     mock_session = AsyncMock()
     if expected_exception:
-        if exc_message:
-            exception = expected_exception(exc_message)
-            mock_session.execute.side_effect = exception
-            mock_session.commit.side_effect = exception
-            with pytest.raises(expected_exception) as exc_info:
-                await TransactionRepository.update_transaction(
-                    session=mock_session,
-                    id_transaction=id_transaction,
-                    category_id=category_id,
-                    new_amount=new_amount,
-                    new_description=new_description,
-                    category_type=category_type,
-                )
-        else:
-            mock_session.execute.side_effect = expected_exception
-            with pytest.raises(expected_exception):
-                await TransactionRepository.update_transaction(
-                    session=mock_session,
-                    id_transaction=id_transaction,
-                    category_id=category_id,
-                    new_amount=new_amount,
-                    new_description=new_description,
-                    category_type=category_type,
-                )
+        mock_session.execute.side_effect = expected_exception(exc_message) if exc_message else expected_exception
+        with pytest.raises(expected_exception):
+            await TransactionRepository.update_transaction(
+                session=mock_session,
+                user_id=1,
+                id_transaction=id_transaction,
+                category_name=category_name,
+                new_amount=new_amount,
+                new_description=new_description,
+            )
+        mock_session.commit.assert_not_called()
     else:
-        mock_result = AsyncMock()
+        mock_result = MagicMock()
+        mock_result.one_or_none.return_value = (
+            (returned_id, 1, datetime(2023, 1, 2), 'expenses', new_amount, 2, datetime(2023, 1, 2), 'income', Decimal('1.00'))
+            if returned_id else None
+            )
         mock_session.execute.return_value = mock_result
-        await TransactionRepository.update_transaction(
+        result = await TransactionRepository.update_transaction(
             session=mock_session,
+            user_id=1,
             id_transaction=id_transaction,
-            category_id=category_id,
+            category_name=category_name,
             new_amount=new_amount,
             new_description=new_description,
-            category_type=category_type,
         )
-        mock_session.execute.assert_called_once()
-        args, _ = mock_session.execute.call_args
-
-
-        called_query = mock_session.execute.call_args[0][0]
+        assert result == returned_id
+        assert mock_session.execute.call_count == (3 if returned_id else 1)
+        called_query = mock_session.execute.call_args_list[0][0][0]
         assert str(called_query.table) == "transactions"
-        assert called_query.whereclause.right.value == id_transaction
         compiled = called_query.compile()
-        assert compiled.params["id_category"] == category_id
+        assert "FROM categories" in str(compiled)
+        assert "transactions_1.type, transactions_1.amount" in str(compiled)
+        assert compiled.params["id_1"] == id_transaction
+        assert compiled.params["name_1"] == category_name
+        assert compiled.params["id_user_1"] == 1
+        assert "categories.id_user = transactions.id_user" in str(compiled)
         assert compiled.params["description"] == new_description
-        assert compiled.params["type"] == category_type
         if isinstance(new_amount, Decimal):
             assert str(compiled.params["amount"]) == str(new_amount)
-        else:
-            assert compiled.params["amount"] == new_amount
         mock_session.commit.assert_called_once()
 
 
 @pytest.mark.asyncio
-@pytest.mark.parametrize("transaction_id, expected_exception, commit_called", [
-    (1, None, True),
-    (999, None, True),
-    (0, ValueError, False),  
-    (2, SQLAlchemyError, False), 
-    (3, Exception, False),  
+@pytest.mark.parametrize("transaction_id, returned_id, expected_exception, commit_called", [
+    (1, 1, None, True),
+    (999, None, None, True),
+    (0, None, ValueError, False),  
+    (2, None, SQLAlchemyError, False), 
+    (3, None, Exception, False),  
     ], ids=[
     "success_delete",
     "delete_non_existing",
@@ -308,8 +342,10 @@ async def test_update_transaction(
     "db_error",
     "generic_error"
     ])
-async def test_delete_transaction_error(transaction_id,  expected_exception,  commit_called):
+async def test_delete_transaction_error(transaction_id, returned_id, expected_exception, commit_called):
     mock_session = AsyncMock(spec=AsyncSession)
+    row = (returned_id, 1, datetime(2023, 1, 2), 'income', Decimal('5.00')) if returned_id else None
+    mock_session.execute.return_value = MagicMock(**{'one_or_none.return_value': row})
     if expected_exception == SQLAlchemyError:
         mock_session.execute.side_effect = SQLAlchemyError("DB error")
     elif expected_exception == ValueError:
@@ -318,10 +354,125 @@ async def test_delete_transaction_error(transaction_id,  expected_exception,  co
         mock_session.execute.side_effect = Exception("Unexpected error")
     if expected_exception:
         with pytest.raises(expected_exception):
-            await TransactionRepository.delete_transaction(mock_session, transaction_id)
+            await TransactionRepository.delete_transaction(mock_session, 1, transaction_id)
     else:
-        await TransactionRepository.delete_transaction(mock_session, transaction_id)
+        assert await TransactionRepository.delete_transaction(mock_session, 1, transaction_id) == returned_id
+        called_query = mock_session.execute.call_args_list[0][0][0]
+        assert called_query.whereclause.compare(
+            (Transaction.id == transaction_id) & (Transaction.id_user == 1)
+        )
+        assert mock_session.execute.call_count == (3 if returned_id else 1)
     assert mock_session.commit.called == commit_called
 
 
+async def add_food_category(session):
+    await session.execute(insert(Category).values(id=1, name='Food', type='expenses', description='', id_user=1))
+    await session.execute(insert(UserBalance).values(id_user=1))
+    await session.commit()
+
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ['ndjson', 'csv'])
+async def test_export_streams_full_history(sqlite_sessionmaker, format):
+    async with sqlite_sessionmaker() as session:
+        await add_food_category(session)
+        await session.execute(insert(Transaction), [
+            {'id': i, 'id_user': 1, 'amount': Decimal('1.50'), 'type': 'expenses', 'date': datetime(2023, 1, i), 'description': 'd', 'id_category': 1}
+            for i in range(1, 6)
+            ])
+        await session.commit()
+    chunks = [chunk async for chunk in export_rows(sqlite_sessionmaker, 1, format)]
+    lines = ''.join(chunks).splitlines()
+    if format == 'csv':
+        assert lines[0] == 'id,name,type,amount,date,description'
+        assert lines[1].startswith('5,Food,expenses,1.50,2023-01-05')
+        assert len(lines) == 6
+    else:
+        assert [json.loads(line)['id'] for line in lines] == [5, 4, 3, 2, 1]
+        assert json.loads(lines[0])['amount'] == 1.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("as_csv", [False, True])
+async def test_bulk_import_reports_row_errors(sqlite_sessionmaker, as_csv, mocker):
+    delay = mocker.patch('app.core.tasks.process_task_celery.delay', return_value=True)
+    rows = [
+        {'category': 'Food', 'amount': '10.50', 'description': 'a', 'date': '2023-01-02T10:00:00'},
+        {'category': 'Unknown', 'amount': '1', 'description': 'b', 'date': ''},
+        {'category': 'Food', 'amount': '-5', 'description': 'c', 'date': ''},
+        {'category': 'Food', 'amount': '3', 'description': 'd', 'date': ''},
+        ]
+    async with sqlite_sessionmaker() as session:
+        await add_food_category(session)
+        app.dependency_overrides[TransactionDepends] = lambda: SimpleNamespace(session=session, user_id=1, redis_app=AsyncMock())
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+                if as_csv:
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+                    writer.writeheader()
+                    writer.writerows(rows)
+                    response = await client.post('/transactions/bulk', files={'file': ('bank.csv', buffer.getvalue())})
+                else:
+                    response = await client.post('/transactions/bulk', json=rows)
+        finally:
+            app.dependency_overrides.clear()
+        assert response.status_code == 200
+        body = response.json()
+        assert body['inserted'] == 2
+        assert [error['row'] for error in body['errors']] == [2, 3]
+        assert body['errors'][0]['error'] == 'No such category'
+        amounts = (await session.scalars(select(Transaction.amount).order_by(Transaction.id))).all()
+        assert amounts == [Decimal('10.50'), Decimal('3.00')]
+        assert await BalanceRepository.get_balance(session, 1) == Decimal('-13.50')
+        rollups = (await session.execute(select(MonthlyRollup.month, MonthlyRollup.total, MonthlyRollup.count))).all()
+        assert (date(2023, 1, 1), Decimal('10.50'), 1) in rollups
+    delay.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_unreadable_files(mocker):
+    mocker.patch('app.routes.transactions.BULK_MAX_BYTES', 64)
+    app.dependency_overrides[TransactionDepends] = lambda: SimpleNamespace(session=AsyncMock(), user_id=1, redis_app=AsyncMock())
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            cp1251 = await client.post('/transactions/bulk', files={'file': ('bank.csv', 'category\nЕда\n'.encode('cp1251'))})
+            too_big = await client.post('/transactions/bulk', files={'file': ('bank.csv', b'category\n' + b'Food\n' * 20)})
+            too_big_json = await client.post('/transactions/bulk', json=[{'category': 'Food'}] * 10)
+    finally:
+        app.dependency_overrides.clear()
+    assert cp1251.status_code == 422
+    assert too_big.status_code == 413
+    assert too_big_json.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_and_delete_are_scoped_to_user(sqlite_sessionmaker, mocker):
+    mocker.patch('app.core.tasks.process_task_celery.delay', return_value=True)
+    async with sqlite_sessionmaker() as session:
+        await add_food_category(session)
+        await session.execute(insert(User).values(id=2, name='o', email='o@mail.ru', hashed_password='x', date_registration=datetime(2023, 1, 1)))
+        await session.execute(insert(Category), [
+            {'id': 2, 'name': 'Salary', 'type': 'income', 'description': '', 'id_user': 1},
+            {'id': 3, 'name': 'Food', 'type': 'expenses', 'description': '', 'id_user': 2},
+            ])
+        await session.execute(insert(Transaction), [
+            {'id': i, 'id_user': 1 if i <= 4 else 2, 'amount': 1, 'type': 'expenses', 'date': datetime(2023, 1, i), 'description': '', 'id_category': 1 if i <= 4 else 3}
+            for i in range(1, 7)
+            ])
+        await session.commit()
+        app.dependency_overrides[TransactionDepends] = lambda: SimpleNamespace(session=session, user_id=1, redis_app=AsyncMock())
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+                moved = await client.put('/transactions/bulk', json={'ids': [1, 2, 5], 'new_category': 'Salary'})
+                missing = await client.put('/transactions/bulk', json={'ids': [3], 'new_category': 'Nope'})
+                unfiltered = await client.request('DELETE', '/transactions/bulk', json={})
+                deleted = await client.request('DELETE', '/transactions/bulk', json={'category': 'Food', 'date_from': '2023-01-04T00:00:00'})
+        finally:
+            app.dependency_overrides.clear()
+        assert moved.json() == {'count': 2}
+        assert missing.status_code == 404
+        assert unfiltered.status_code == 422
+        assert deleted.json() == {'count': 1}
+        rows = (await session.execute(select(Transaction.id, Transaction.type, Transaction.id_category).order_by(Transaction.id))).all()
+        assert rows == [(1, 'income', 2), (2, 'income', 2), (3, 'expenses', 1), (5, 'expenses', 3), (6, 'expenses', 3)]
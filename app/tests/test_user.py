@@ -1,4 +1,4 @@
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from sqlalchemy.sql import Select, Insert
@@ -125,20 +125,25 @@ async def test_checking_user_existence_by_email_errors(exception, test_email):
 )
 async def test_adding_user(name, email, password, scenario):
     mock_session = AsyncMock(spec=AsyncSession)
-    await UserRepository.adding_user(
+    mock_session.execute.return_value = MagicMock(**{'scalar.return_value': 7})
+    user_id = await UserRepository.adding_user(
         session=mock_session,
         name=name,
         email=email,
         hashed_password=password
     )
-    mock_session.execute.assert_called_once()
-    called_query = mock_session.execute.call_args[0][0]
+    assert mock_session.execute.call_count == 2
+    called_query = mock_session.execute.call_args_list[0][0][0]
     assert isinstance(called_query, Insert)
     compiled = called_query.compile()
     assert compiled.params["name"] == name
     assert compiled.params["email"] == email
     assert compiled.params["hashed_password"] == password
     assert str(called_query.table) == "users"
+    assert user_id == 7
+    balance_query = mock_session.execute.call_args_list[1][0][0]
+    assert str(balance_query.table) == "user_balances"
+    assert balance_query.compile().params["id_user"] == 7
     mock_session.commit.assert_awaited_once()
 
 
@@ -0,0 +1,44 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import redis as redis_cache
+from app.repositories.user import UserRepository
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    redis_cache.user_exists_cache.clear()
+    yield
+    redis_cache.user_exists_cache.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("db_result, expected", [(5, True), (None, False)])
+async def test_redis_user_exists_caches_result(monkeypatch, db_result, expected):
+    session = AsyncMock(spec=AsyncSession)
+    redis_app = AsyncMock()
+    redis_app.get.return_value = None
+    checking_user_id = AsyncMock(return_value=db_result)
+    monkeypatch.setattr(UserRepository, 'checking_user_id', checking_user_id)
+    assert await redis_cache.redis_user_exists(session, redis_app, 5) is expected
+    assert await redis_cache.redis_user_exists(session, redis_app, 5) is expected
+    checking_user_id.assert_awaited_once()
+    redis_app.get.assert_awaited_once()
+    assert redis_app.setex.call_args[0][2] == ('1' if expected else '0')
+
+
+@pytest.mark.asyncio
+async def test_redis_user_exists_from_redis_and_invalidate(monkeypatch):
+    session = AsyncMock(spec=AsyncSession)
+    redis_app = AsyncMock()
+    redis_app.get.return_value = '0'
+    checking_user_id = AsyncMock(return_value=3)
+    monkeypatch.setattr(UserRepository, 'checking_user_id', checking_user_id)
+    assert await redis_cache.redis_user_exists(session, redis_app, 3) is False
+    checking_user_id.assert_not_awaited()
+    redis_app.get.return_value = None
+    await redis_cache.invalidate_user_cache(redis_app, 3)
+    assert await redis_cache.redis_user_exists(session, redis_app, 3) is True
+    redis_app.delete.assert_awaited_once_with('User exists: 3', 'User information: 3')
@@ -0,0 +1,68 @@
+"""per-user indexes
+
+Revision ID: 57dae95dd63b
+Revises: ecdde93b4f2f
+Create Date: 2026-10-18 10:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '57dae95dd63b'
+down_revision: Union[str, None] = 'ecdde93b4f2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (id_user, date, id) serves every "WHERE id_user = ?" lookup and the (date, id) ordering of the listing,
+# so it stands in for a plain index on transactions.id_user.
+INDEXES = [
+    ('ix_transactions_id_user_date_id', 'transactions', ['id_user', 'date', 'id']),
+    ('ix_transactions_id_user_type_date', 'transactions', ['id_user', 'type', 'date']),
+    ('ix_transactions_id_category', 'transactions', ['id_category']),
+]
+
+# Both earlier revisions added UNIQUE(id) next to the primary key; Postgres named them <table>_id_key[1].
+REDUNDANT_UNIQUE = [f'{table}_id_key{suffix}' for table in ('users', 'categories', 'transactions') for suffix in ('', '1')]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not context.is_offline_mode():
+        duplicates = op.get_bind().execute(sa.text(
+            'SELECT count(*) FROM (SELECT 1 FROM categories GROUP BY id_user, name HAVING count(*) > 1) AS d'
+            )).scalar()
+        if duplicates:
+            raise RuntimeError(f'{duplicates} duplicate (id_user, name) pairs in categories must be merged first')
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(
+            'uq_categories_id_user_name', 
+            'categories', 
+            ['id_user', 'name'], 
+            unique=True, 
+            postgresql_concurrently=True, 
+            if_not_exists=True,
+            )
+    op.execute(
+        'ALTER TABLE categories ADD CONSTRAINT uq_categories_id_user_name '
+        'UNIQUE USING INDEX uq_categories_id_user_name'
+        )
+    for constraint in REDUNDANT_UNIQUE:
+        table = constraint.rsplit('_id_key', 1)[0]
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for constraint in REDUNDANT_UNIQUE:
+        op.create_unique_constraint(constraint, constraint.rsplit('_id_key', 1)[0], ['id'])
+    op.drop_constraint('uq_categories_id_user_name', 'categories', type_='unique')
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
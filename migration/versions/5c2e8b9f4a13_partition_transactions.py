@@ -0,0 +1,99 @@
+"""partition transactions by month
+
+Revision ID: 5c2e8b9f4a13
+Revises: d81e4a6c0f27
+Create Date: 2026-10-18 16:21:37.480125
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e8b9f4a13'
+down_revision: Union[str, None] = 'd81e4a6c0f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_transactions_id_user_date_id', ['id_user', 'date', 'id']),
+    ('ix_transactions_id_user_type_date', ['id_user', 'type', 'date']),
+    ('ix_transactions_id_category', ['id_category']),
+]
+
+COLUMNS = 'id, id_user, amount, type, date, description, id_category'
+
+# Months created past the current one; the rest is kept up by the maintain_transaction_partitions task.
+MONTHS_AHEAD = 3
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_transactions_table(primary_key: list, **kwargs):
+    op.create_table(
+        'transactions',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('transactions_id_seq')"), nullable=False),
+        sa.Column('id_user', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=11, scale=2), nullable=False),
+        sa.Column('type', postgresql.ENUM(name='categorytype', create_type=False), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('description', sa.String(length=50), nullable=False),
+        sa.Column('id_category', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['id_user'], ['users.id']),
+        sa.ForeignKeyConstraint(['id_category'], ['categories.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint(*primary_key, name='transactions_pkey'),
+        **kwargs,
+    )
+
+
+def move_transactions(source: str):
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM {source}')
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+    op.drop_table(source)
+    for name, columns in INDEXES:
+        op.create_index(name, 'transactions', columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The partition key has to be part of the primary key, so the table is rebuilt and the rows copied.
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    first = current
+    if not context.is_offline_mode():
+        oldest = op.get_bind().execute(sa.text(
+            "SELECT date_trunc('month', min(date) AT TIME ZONE 'UTC')::date FROM transactions"
+            )).scalar()
+        first = min(oldest or current, current)
+    op.rename_table('transactions', 'transactions_heap')
+    op.execute('ALTER TABLE transactions_heap RENAME CONSTRAINT transactions_pkey TO transactions_heap_pkey')
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='transactions_heap', if_exists=True)
+    create_transactions_table(['id', 'date'], postgresql_partition_by='RANGE (date)')
+    month = first
+    while month <= add_months(current, MONTHS_AHEAD):
+        op.execute(
+            f'CREATE TABLE transactions_{month:%Y_%m} PARTITION OF transactions '
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')"
+            )
+        month = add_months(month, 1)
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+    move_transactions('transactions_heap')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Partitions detached by the maintenance task are left alone; their rows are not copied back.
+    op.rename_table('transactions', 'transactions_partitioned')
+    op.execute('ALTER TABLE transactions_partitioned RENAME CONSTRAINT transactions_pkey TO transactions_partitioned_pkey')
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='transactions_partitioned')
+    create_transactions_table(['id'])
+    move_transactions('transactions_partitioned')
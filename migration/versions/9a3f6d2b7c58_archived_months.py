@@ -0,0 +1,34 @@
+"""archived months
+
+Revision ID: 9a3f6d2b7c58
+Revises: 5c2e8b9f4a13
+Create Date: 2026-10-18 18:42:09.317264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f6d2b7c58'
+down_revision: Union[str, None] = '5c2e8b9f4a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'archived_months',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('month'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('archived_months')
@@ -0,0 +1,45 @@
+"""user balances
+
+Revision ID: b3f1c7a92d4e
+Revises: 57dae95dd63b
+Create Date: 2026-10-18 12:40:07.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f1c7a92d4e'
+down_revision: Union[str, None] = '57dae95dd63b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_balances',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('id_user', sa.Integer(), nullable=False),
+        sa.Column('income', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('expenses', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['id_user'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id_user'),
+    )
+    op.execute(
+        "INSERT INTO user_balances (id_user, income, expenses) "
+        "SELECT users.id, "
+        "COALESCE(SUM(transactions.amount) FILTER (WHERE transactions.type = 'income'), 0), "
+        "COALESCE(SUM(transactions.amount) FILTER (WHERE transactions.type = 'expenses'), 0) "
+        "FROM users LEFT JOIN transactions ON transactions.id_user = users.id "
+        "GROUP BY users.id"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_balances')
@@ -0,0 +1,54 @@
+"""monthly rollups
+
+Revision ID: d81e4a6c0f27
+Revises: b3f1c7a92d4e
+Create Date: 2026-10-18 14:05:52.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81e4a6c0f27'
+down_revision: Union[str, None] = 'b3f1c7a92d4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'monthly_rollups',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('id_user', sa.Integer(), nullable=False),
+        sa.Column('id_category', sa.Integer(), nullable=True),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('type', postgresql.ENUM(name='categorytype', create_type=False), nullable=False),
+        sa.Column('total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['id_user'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['id_category'], ['categories.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'id_user', 'id_category', 'month', 'type', 
+            name='uq_monthly_rollups_key', 
+            postgresql_nulls_not_distinct=True,
+            ),
+    )
+    op.create_index('ix_monthly_rollups_id_category', 'monthly_rollups', ['id_category'])
+    op.execute(
+        "INSERT INTO monthly_rollups (id_user, id_category, month, type, total, count) "
+        "SELECT id_user, id_category, date_trunc('month', date AT TIME ZONE 'UTC')::date AS month, type, "
+        "SUM(amount), COUNT(*) "
+        "FROM transactions GROUP BY id_user, id_category, month, type"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_monthly_rollups_id_category', table_name='monthly_rollups')
+    op.drop_table('monthly_rollups')